@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Regression and throughput check for vorganize.core.Classifier.
+
+Every name in classifier_corpus.json must classify to the listed fields, and its title must be filed
+under the listed show folder ("folder", checked with strip_season) when one is given; the corpus is then
+repeated up to --count names and classified with classify_batch to measure names per second.
+Exits non-zero on a mismatch or when throughput falls below --min-rate.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vorganize.core import Classifier, MediaInfo  # noqa: E402
+from vorganize.titles import strip_season  # noqa: E402
+
+CORPUS = Path(__file__).resolve().parent / "classifier_corpus.json"
+
+
+def check_corpus(classifier, corpus):
+    failures = 0
+    for case in corpus:
+        info = classifier.classify(case["name"])
+        for field in MediaInfo._fields:
+            expected = case.get(field)
+            actual = getattr(info, field)
+            if actual != expected:
+                failures += 1
+                print(f"FAIL {case['name']!r}: {field} = {actual!r}, expected {expected!r}")
+        if "folder" in case and info.title is not None and strip_season(info.title) != case["folder"]:
+            failures += 1
+            print(f"FAIL {case['name']!r}: folder = {strip_season(info.title)!r}, expected {case['folder']!r}")
+    return failures
+
+
+def measure(classifier, corpus, count):
+    names = [case["name"] for case in corpus]
+    names = (names * (count // len(names) + 1))[:count]
+    start = time.perf_counter()
+    classifier.classify_batch(names)
+    elapsed = time.perf_counter() - start
+    return count / elapsed if elapsed else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", help="JSON rules file to test instead of the built-in rules")
+    parser.add_argument("--corpus", default=str(CORPUS), help="corpus JSON file")
+    parser.add_argument("--count", type=int, default=100_000, help="names to classify for the throughput run")
+    parser.add_argument("--min-rate", type=float, default=0, help="fail below this many names per second")
+    args = parser.parse_args()
+
+    classifier = Classifier.from_file(args.rules) if args.rules else Classifier()
+    with open(args.corpus, "r") as f:
+        corpus = json.load(f)
+
+    failures = check_corpus(classifier, corpus)
+    rate = measure(classifier, corpus, args.count)
+    print(json.dumps({"corpus": len(corpus), "failures": failures, "count": args.count, "names_per_second": round(rate)}))
+    if failures or rate < args.min_rate:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Time each phase of an organize run on a synthetic library.
+
+Generates a library with generate_library.py (same options) in --workdir, then times separately:
+scan (scan_videos + SubtitleIndex), classify (prepare_lists), store (store_as_json into a JsonCatalog,
+or the SQLite index with --catalog sqlite), move (move_series/move_items) and interactive
+(handle_inter on --interactive other videos, answered by a scripted input()). Prints the timings as JSON,
+or writes them to --output, so runs of different versions can be compared.
+"""
+
+import argparse
+import builtins
+import contextlib
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generate_library import add_arguments, generate_library  # noqa: E402
+from vorganize import (  # noqa: E402
+    VIDEO_EXTS,
+    Classifier,
+    JsonCatalog,
+    LibraryIndex,
+    MoveScheduler,
+    SubtitleIndex,
+    handle_inter,
+    move_items,
+    move_series,
+    prepare_lists,
+    scan_videos,
+    store_as_json,
+)
+
+
+class _RecordingCatalog:
+    """Collects store() calls during classification so persistence can be timed on its own."""
+
+    def __init__(self):
+        self.calls = []
+
+    def store(self, video_type, data, json_file, source=None, subtitle=None):
+        self.calls.append((video_type, data, json_file, source, subtitle))
+
+
+def _version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Hide progress bars (stderr) while a phase runs."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        yield
+
+
+@contextlib.contextmanager
+def _scripted_input(answers):
+    answers = iter(answers)
+    original = builtins.input
+    builtins.input = lambda prompt="": next(answers)
+    try:
+        yield
+    finally:
+        builtins.input = original
+
+
+def run(workdir, args):
+    source, dest, meta = workdir / "source", workdir / "dest", workdir / "meta"
+    for directory in (dest / "shows", dest / "Movies", dest / "other_videos", meta):
+        directory.mkdir(parents=True, exist_ok=True)
+    phases = {}
+
+    def record(name, elapsed, files):
+        phases[name] = {
+            "seconds": round(elapsed, 4),
+            "files": files,
+            "files_per_second": round(files / elapsed, 1) if elapsed else None,
+        }
+
+    start = time.perf_counter()
+    library = generate_library(source, args.count, args.mix, args.subtitles, args.depth, args.size_mb, args.seed)
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    subtitle_index = SubtitleIndex(source)
+    items = list(scan_videos(source, VIDEO_EXTS, subtitle_index, max_depth=args.depth + 1, forget_subtitles=False))
+    record("scan", time.perf_counter() - start, len(items))
+
+    series_dict = defaultdict(lambda: defaultdict(list))
+    movies, other_videos = [], []
+    recorder = _RecordingCatalog()
+    classifier = Classifier()
+    json_files = {kind: str(meta / name) for kind, name in (("s", "shows.json"), ("m", "movies.json"), ("o", "other_videos.json"))}
+    start = time.perf_counter()
+    for item in items:
+        prepare_lists(item.relpath, source, series_dict, movies, other_videos, shows_json=json_files["s"], movies_json=json_files["m"], other_videos_json=json_files["o"], catalog=recorder, subtitle_index=subtitle_index, classifier=classifier, entry=item.entry)
+    record("classify", time.perf_counter() - start, len(items))
+
+    start = time.perf_counter()
+    catalog = LibraryIndex(meta / "library.db") if args.catalog == "sqlite" else JsonCatalog()
+    with catalog:
+        for video_type, data, json_file, item_source, subtitle in recorder.calls:
+            store_as_json(video_type, data, json_file, catalog, source=item_source, subtitle=subtitle)
+    record("store", time.perf_counter() - start, len(recorder.calls))
+
+    interactive = other_videos[:args.interactive]
+    scheduler = MoveScheduler(max_workers=args.jobs)
+    episodes = sum(len(episodes) for seasons in series_dict.values() for episodes in seasons.values())
+    start = time.perf_counter()
+    with _quiet():
+        move_series(series_dict, source, dest / "shows", scheduler=scheduler)
+        move_items(movies, source, dest / "Movies", "movies", scheduler=scheduler)
+        move_items(other_videos[args.interactive:], source, dest / "other_videos", "videos", scheduler=scheduler)
+    record("move", time.perf_counter() - start, episodes + len(movies) + len(other_videos) - len(interactive))
+
+    if interactive:
+        # Keep every name, then answer movies / other videos in turn
+        answers = itertools.cycle(["", "m", "", "o"])
+        dest_dict = {"s": dest / "shows", "m": dest / "Movies", "o": dest / "other_videos"}
+        start = time.perf_counter()
+        with _quiet(), _scripted_input(answers), JsonCatalog() as catalog:
+            handle_inter(source, interactive, dest_dict, catalog=catalog, classifier=classifier)
+        record("interactive", time.perf_counter() - start, len(interactive))
+
+    return {
+        "version": _version(),
+        "python": platform.python_version(),
+        "parameters": {
+            "count": args.count,
+            "mix": list(args.mix),
+            "subtitles": args.subtitles,
+            "depth": args.depth,
+            "seed": args.seed,
+            "catalog": args.catalog,
+            "jobs": args.jobs,
+        },
+        "library": library,
+        "classified": {"series": episodes, "movies": len(movies), "other": len(other_videos)},
+        "generate_seconds": round(generate_seconds, 3),
+        "phases": phases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--workdir", help="folder for the generated library (default: a temporary folder, removed afterwards)")
+    parser.add_argument("--catalog", choices=["json", "sqlite"], default="json", help="catalog backend for the store phase (default: json)")
+    parser.add_argument("--jobs", type=int, default=4, help="move workers (default: 4)")
+    parser.add_argument("--interactive", type=int, default=100, metavar="N", help="other videos to categorize with scripted input (default: 100)")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.workdir:
+        workdir = Path(args.workdir)
+        if workdir.exists() and any(workdir.iterdir()):
+            parser.error(f"--workdir {workdir} is not empty")
+        results = run(workdir, args)
+    else:
+        workdir = Path(tempfile.mkdtemp(prefix="vorganize-bench-"))
+        try:
+            results = run(workdir, args)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compare shutil.move with vorganize's cross-device transfer path.
+
+Writes --count files of --size-gb each into --source, moves them to --dest with each method
+and prints the timings as JSON. Point --source and --dest at different filesystems: on a single
+filesystem every method is a rename. The page cache is not dropped between runs (that needs root),
+so run it on files larger than RAM for disk-bound numbers.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vorganize.executor import transfer_file  # noqa: E402
+
+BLOCK = 8 * 1024 * 1024
+
+
+def make_files(directory, count, size):
+    block = os.urandom(BLOCK)
+    files = []
+    for i in range(count):
+        path = directory / f"bench-transfer-{i}.bin"
+        with open(path, "wb") as f:
+            remaining = size
+            while remaining > 0:
+                remaining -= f.write(block[:remaining])
+        files.append(path)
+    return files
+
+
+METHODS = {
+    "shutil.move": lambda source, dest: shutil.move(source, dest),
+    "transfer_file": lambda source, dest: transfer_file(source, dest),
+    "transfer_file+verify": lambda source, dest: transfer_file(source, dest, verify=True),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="directory on the source filesystem")
+    parser.add_argument("--dest", required=True, help="directory on the destination filesystem")
+    parser.add_argument("--size-gb", type=float, default=2, help="size of each file in GiB (default: 2)")
+    parser.add_argument("--count", type=int, default=2, help="files per method (default: 2)")
+    args = parser.parse_args()
+
+    source, dest = Path(args.source), Path(args.dest)
+    size = int(args.size_gb * 1024 ** 3)
+    same_device = source.stat().st_dev == dest.stat().st_dev
+    results = {"size_bytes": size, "count": args.count, "same_device": same_device, "methods": {}}
+
+    for name, method in METHODS.items():
+        files = make_files(source, args.count, size)
+        start = time.perf_counter()
+        for path in files:
+            method(path, dest / path.name)
+        elapsed = time.perf_counter() - start
+        for path in files:
+            (dest / path.name).unlink()
+        results["methods"][name] = {
+            "seconds": round(elapsed, 3),
+            "mb_per_second": round(size * args.count / elapsed / 1024 ** 2, 1),
+        }
+
+    print(json.dumps(results, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
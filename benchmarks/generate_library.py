@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic download folder for benchmarking.
+
+Creates --count sparse video files (they take no disk space, whatever --size-mb says) named after the
+conventions vorganize recognizes: "Show S01E01", "Show.Name.S02E05.1080p.WEB.x264", "Show 1x03",
+"Show Season 1 Episode 2", "Movie (2020)", "The.Movie.1999.1080p.BluRay.x264", "The_Movie_1999_720p",
+plus names that match nothing. --mix sets the series/movie/other ratio, --subtitles the share of videos
+with a subtitle (next to the video or in a Subs/ folder) and --depth how deep release folders are nested.
+"""
+
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+WORDS = [
+    "silent", "river", "broken", "empire", "midnight", "garden", "iron", "crown", "lost", "signal",
+    "paper", "moon", "hidden", "harbor", "glass", "tiger", "winter", "station", "golden", "echo",
+    "crimson", "valley", "last", "frontier", "wild", "ocean", "shadow", "city", "northern", "lights",
+    "burning", "bridge", "quiet", "storm", "electric", "dreams", "stolen", "summer", "black", "orchid",
+    "distant", "thunder", "secret", "archive", "falling", "sky", "velvet", "road",
+]
+RESOLUTIONS = ["720p", "1080p", "2160p"]
+SOURCES = ["WEB", "BluRay", "HDTV", "WEBRip"]
+CODECS = ["x264", "x265", "HEVC"]
+VIDEO_EXTS = ["mkv", "mp4"]
+OTHER_EXTS = ["mp4", "mov", "avi", "wmv", "mkv"]
+
+
+class _Titles:
+    """Unique random titles of two to four words."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.used = set()
+
+    def __call__(self):
+        while True:
+            words = self.rng.sample(WORDS, self.rng.randint(2, 4))
+            title = " ".join(word.capitalize() for word in words)
+            if title not in self.used:
+                self.used.add(title)
+                return title
+
+
+def _series_name(rng, title, season, episode):
+    dotted = title.replace(" ", ".")
+    style = rng.randrange(5)
+    if style == 0:
+        return f"{title} S{season:02}E{episode:02}.mkv"
+    if style == 1:
+        return f"{dotted}.S{season:02}E{episode:02}.{rng.choice(RESOLUTIONS)}.{rng.choice(SOURCES)}.{rng.choice(CODECS)}.{rng.choice(VIDEO_EXTS)}"
+    if style == 2:
+        return f"{title} {season}x{episode:02}.{rng.choice(VIDEO_EXTS)}"
+    if style == 3:
+        return f"{title} Season {season} Episode {episode}.mkv"
+    return f"{dotted}.S{season:02}.E{episode:02}.{rng.choice(RESOLUTIONS)}.mkv"
+
+
+def _movie_name(rng, title, year):
+    style = rng.randrange(3)
+    if style == 0:
+        return f"{title} ({year}).{rng.choice(VIDEO_EXTS)}"
+    if style == 1:
+        return f"{title.replace(' ', '.')}.{year}.{rng.choice(RESOLUTIONS)}.{rng.choice(SOURCES)}.{rng.choice(CODECS)}.{rng.choice(VIDEO_EXTS)}"
+    return f"{title.replace(' ', '_')}_{year}_{rng.choice(RESOLUTIONS)}.{rng.choice(VIDEO_EXTS)}"
+
+
+def _other_name(rng, i):
+    style = rng.randrange(3)
+    if style == 0:
+        return f"VID_2024{rng.randint(1, 12):02}{rng.randint(1, 28):02}_{i:06}.{rng.choice(OTHER_EXTS)}"
+    if style == 1:
+        return f"Home Clip {i}.{rng.choice(OTHER_EXTS)}"
+    return f"screen-recording-{i}.{rng.choice(OTHER_EXTS)}"
+
+
+def _folder(rng, depth, release):
+    """A relative folder up to depth levels deep, ending in the release folder when there is room."""
+    levels = rng.randint(0, depth)
+    parts = [f"batch-{rng.randrange(8)}" for _ in range(max(levels - 1, 0))]
+    if levels:
+        parts.append(release)
+    return "/".join(parts)
+
+
+def _touch(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+
+def generate_library(root, count=1000, mix=(0.5, 0.3, 0.2), subtitle_ratio=0.3, depth=2, size_mb=700, seed=0):
+    """
+    Create count sparse videos (and subtitles) under root and return a summary dict
+    with the number of series episodes, movies, other videos and subtitles written.
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    size = int(size_mb * 1024 * 1024)
+    titles = _Titles(rng)
+    total = sum(mix)
+    kinds = rng.choices("smo", weights=[part / total for part in mix], k=count)
+    summary = {"series": 0, "movies": 0, "other": 0, "subtitles": 0}
+
+    show, season, episode, folder = None, 0, 0, ""
+    for i, kind in enumerate(kinds):
+        if kind == "s":
+            # Episodes come in runs of seasons of one show, each season in its own release folder
+            if show is None or episode >= 24:
+                if show is None or season >= rng.randint(1, 8):
+                    show, season = titles(), 0
+                season, episode = season + 1, 0
+                folder = _folder(rng, depth, f"{show.replace(' ', '.')}.S{season:02}.{rng.choice(RESOLUTIONS)}")
+            episode += 1
+            name = _series_name(rng, show, season, episode)
+            relative_dir = folder
+            summary["series"] += 1
+        elif kind == "m":
+            title, year = titles(), rng.randint(1950, 2025)
+            name = _movie_name(rng, title, year)
+            relative_dir = _folder(rng, depth, f"{title.replace(' ', '.')}.{year}")
+            summary["movies"] += 1
+        else:
+            name = _other_name(rng, i)
+            relative_dir = _folder(rng, min(depth, 1), "misc")
+            summary["other"] += 1
+
+        video = root / relative_dir / name
+        _touch(video, size)
+        if kind != "o" and rng.random() < subtitle_ratio:
+            stem = name.rpartition(".")[0]
+            if relative_dir and rng.random() < 0.3:
+                subtitle = root / relative_dir / "Subs" / f"{stem}.en.srt"
+            else:
+                subtitle = root / relative_dir / f"{stem}{rng.choice(['', '.en', '.eng.forced'])}.srt"
+            _touch(subtitle, 40 * 1024)
+            summary["subtitles"] += 1
+    return summary
+
+
+def parse_mix(text):
+    parts = [float(part) for part in text.split(",")]
+    if len(parts) != 3 or any(part < 0 for part in parts) or not sum(parts):
+        raise argparse.ArgumentTypeError("expected three non-negative weights: SERIES,MOVIES,OTHER")
+    return tuple(parts)
+
+
+def add_arguments(parser):
+    parser.add_argument("--count", type=int, default=1000, help="number of videos, e.g. 1000 to 500000 (default: 1000)")
+    parser.add_argument("--mix", type=parse_mix, default=(0.5, 0.3, 0.2), metavar="S,M,O", help="series,movies,other weights (default: 0.5,0.3,0.2)")
+    parser.add_argument("--subtitles", type=float, default=0.3, metavar="RATIO", help="share of series/movies with a subtitle (default: 0.3)")
+    parser.add_argument("--depth", type=int, default=2, help="maximum release folder nesting (default: 2, 0 = flat)")
+    parser.add_argument("--size-mb", type=float, default=700, help="apparent size of each sparse video (default: 700)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="folder to create the library in")
+    add_arguments(parser)
+    args = parser.parse_args()
+    summary = generate_library(args.root, args.count, args.mix, args.subtitles, args.depth, args.size_mb, args.seed)
+    print(json.dumps(summary, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,36 +1,27 @@
 #!/usr/bin/env python3
 
 import argparse
+import cProfile
+import json
+import signal
+import sys
+import time
 import textwrap
 from pathlib import Path
-import re, os
+import os
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import colorama
-from colorama import Fore, Style
-from vorganize import prepare_lists, move_series, move_items, handle_inter
-
-# Custom logging formatter
-class CustomFormatter(logging.Formatter):
-    def format(self, record):
-        indent = "  " * getattr(record, "indent", 0)
-        if record.levelno == logging.INFO:
-            return f"{indent}{Fore.GREEN}{record.msg}{Style.RESET_ALL}"
-        elif record.levelno == logging.WARNING:
-            return f"{indent}{Fore.YELLOW}{record.msg}{Style.RESET_ALL}"
-        elif record.levelno == logging.ERROR:
-            return f"{indent}{Fore.RED}{record.msg}{Style.RESET_ALL}"
-        elif record.levelno == logging.DEBUG:
-            return f"{indent}{Fore.BLUE}{record.msg}{Style.RESET_ALL}"
-        return f"{indent}{record.msg}"
-
-# Set up logging
-colorama.init(autoreset=True)
+# Only what every run needs; optional features (queries, chunking, watching, recovery) import theirs where used
+from vorganize import Journal, unfinished_runs, ShowIndex, enable_metrics, disable_metrics, get_metrics, setup_logging, scan_videos, default_ignore, ScanItem, Classifier, VIDEO_EXTS, common_subtitle_exts, SubtitleIndex, prepare_lists, restore_entry, plan_series, plan_items, execute_plan, MovePlan, DeferredCatalog, library_folders, open_catalog, make_scheduler, make_deduper, make_prober
+from vorganize.console import colors
+from vorganize.storage import DEFAULT_SCRIPT_DIR
+
+# Set up logging: colored on a terminal, plain lines without progress bars when headless (cron, pipes).
+# The command line below can change the level, force headless mode and add a JSON-lines log.
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)  # Changed to DEBUG to show debug logs
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(CustomFormatter())
-logger.handlers = [console_handler]
+setup_logging()
+Fore, Style = colors()
 
 # Custom help formatter for argparse
 class CustomHelpFormatter(argparse.RawDescriptionHelpFormatter):
@@ -39,68 +30,411 @@ class CustomHelpFormatter(argparse.RawDescriptionHelpFormatter):
             prefix = f"{Fore.CYAN}Usage:{Style.RESET_ALL} "
         return super().add_usage(usage, actions, groups, prefix)
 
-def main(path, dest_dir, interactive, script_dir="/home/malale/.local/movies_script/"):
-    path = Path(path)
-    dest_dir = Path(dest_dir)
-    series_dict = defaultdict(lambda: defaultdict(list))
-    movies = []
-    other_videos = []
-    
-    # File patterns and subtitle extensions
-    video_ext = ['mp4', 'avi', 'mkv', 'mov', 'wmv']
-    common_subtitle_exts = ["srt", "sub", "idx", "ssa", "ass", "vtt", "smi", "sami", "stl"]
-    #series_pattern = re.compile(r"^(?P<title>.+?)\s*(?:S|Season\s*)(\d{1,2})(?:E|Episode\s*|\.|-|x)\d{1,2}", re.IGNORECASE)
-    series_pattern = re.compile(r"(?i)(?:S|Season\s*)(\d{1,2})(?:E|Episode\s*|\.|-|x)\d{1,2}", re.IGNORECASE)
-    series_pattern2 = re.compile(r'.+ S\d{2} E\d{2}\s+@Series_index_x\.mkv', re.IGNORECASE)
-    movie_pattern = re.compile(r".*\(\d{4}\).*", re.IGNORECASE)
-    movie_pattern2 = re.compile(r'^[\w\s\-\.]+?\.\d{4}\.?(?:720p|1080p)?\.?(?:BluRay|WEBRip|WEB-DL|BrRip)?\.?(?:x264|x265|HEVC|AAC)?\.?(?:6CH|DDP5\.1|10bit)?\.?(?:[\w\-\.\[\]]+)?\.(?:mkv|mp4)$')
-    movie_pattern3 = re.compile(r'^[\w\s\-\.]+_\d{4}_[\w\-\.]+?\.(?:mkv|mp4)$')
-    
-    # JSON file paths
-    movies_json = str(Path(script_dir) / "movies.json")
-    shows_json = str(Path(script_dir) / "shows.json")
-    other_videos_json = str(Path(script_dir) / "other_videos.json")
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt(f"stopped by signal {signum}")
+
+
+def stop_on_sigterm():
+    """
+    Stop on SIGTERM (kill, systemd, docker stop) the way Ctrl+C does, so moves in progress finish or are
+    rolled back, the catalog is saved and the journal is closed; returns the previous handler to restore.
+    """
+    try:
+        return signal.signal(signal.SIGTERM, _interrupt)
+    except ValueError:  # Not the main thread (main() called from an embedding program): leave signals alone
+        return None
+
+
+def main(path, dest_dir, interactive, script_dir=DEFAULT_SCRIPT_DIR, flush_every=500, index_db=None, rules_file=None, jobs=4, per_device=1, max_rate=None, max_files=None, link_mode="move", verify=False, depth=4, ignore=default_ignore, dry_run=None, apply_plan=None, watch=False, settle=10, poll_interval=30, metrics_out=None, metrics_textfile=None, dedupe=None, dedupe_sample=4, fuzzy_titles=None, probe=False, movie_minutes=70, recover=False, undo=None, chunk_size=None, memory_budget=256, sort_all=False):
+    # Per-phase timings and counters; without an output file nothing is recorded
+    metrics = enable_metrics() if metrics_out or metrics_textfile else get_metrics()
+    deduper = None
+    journal = None
+    previous_sigterm = stop_on_sigterm()
+    try:
+        # Catalog entries are kept in memory and flushed in batches, at the end, or on interrupt.
+        # With an index database, unchanged files seen by an earlier run are skipped or resumed.
+        classifier = Classifier.from_file(rules_file) if rules_file else Classifier()
+        catalog = open_catalog(script_dir, index_db, flush_every, classifier)
+
+        # Finish or roll back runs that died mid-move, or put back the files of a finished run
+        journal_dir = Path(script_dir) / "journal"
+        if recover:
+            from vorganize import recover_runs
+            totals = recover_runs(journal_dir)
+            logger.info("Recovery: %s", totals or "no unfinished runs", extra={"indent": 0})
+            if path is None and not apply_plan:
+                return
+        elif unfinished_runs(journal_dir):
+            logger.warning("Unfinished runs in %s: run with --recover to finish or roll them back", journal_dir, extra={"indent": 0})
+        if undo:
+            from vorganize import undo_run
+            with catalog:
+                try:
+                    undo_run(journal_dir, None if undo == "last" else undo, catalog, verify=verify)
+                except ValueError as e:
+                    logger.error("%s", e, extra={"indent": 0})
+            return
+
+        scheduler = make_scheduler(jobs, per_device, max_rate, max_files, link_mode, verify)
+        # Every folder created and file moved is journaled, so a crashed run can be recovered or undone
+        journal = Journal(journal_dir, link_mode=link_mode, index_db=index_db) if not dry_run else None
+
+        # Execute a plan written earlier with --dry-run
+        if apply_plan:
+            plan = MovePlan.load(apply_plan)
+            plan.revalidate()
+            logger.info("Applying plan %s: %s", apply_plan, plan.counts(), extra={"indent": 0})
+            with catalog:
+                plan.replay_catalog(catalog)
+                execute_plan(plan, scheduler, catalog, journal)
+            return
+
+        # One or more source folders, organized together into one destination
+        sources = [Path(path)] if isinstance(path, (str, os.PathLike)) else list(dict.fromkeys(Path(p) for p in path))
+        dest_dir = Path(dest_dir)
+
+        # File extensions (the compiled filename classifier is shared with the index)
+        video_ext = VIDEO_EXTS
+        # Names matching no rule can still be classified from their container headers, cached in the index
+        prober = make_prober(catalog, movie_minutes) if probe else None
     
-    # Category mapping
-    category_map = {
-        "s": dest_dir / "shows",
-        "m": dest_dir / "Movies",
-        "o": dest_dir / "other_videos"
-    }
+        # JSON file paths
+        movies_json = str(Path(script_dir) / "movies.json")
+        shows_json = str(Path(script_dir) / "shows.json")
+        other_videos_json = str(Path(script_dir) / "other_videos.json")
     
-    # Create destination directories
-    for dest in category_map.values():
-        dest.mkdir(parents=True, exist_ok=True)
+        # Category mapping
+        category_map = library_folders(dest_dir)
     
-    # Process files
-    logger.info(f"Scanning directory: {path}", extra={"indent": 0})
-    for item in path.iterdir():
-        if item.is_file() and item.suffix[1:].lower() in video_ext:
-            prepare_lists(item.name, path, series_dict, movies, other_videos, series_pattern, movie_pattern, movie_pattern2, movie_pattern3, common_subtitle_exts, shows_json, movies_json, other_videos_json, series_pattern2)
-
-    # Sort lists
-    for series_title in series_dict:
-        for season in series_dict[series_title]:
-            series_dict[series_title][season].sort(key=lambda x: x[0])
-    movies.sort(key=lambda x: x[0])
-    other_videos.sort(key=lambda x: x[0])
-
-    # Move files
-    move_series(series_dict, path, category_map["s"])
-    move_items(movies, path, category_map["m"], item_type="movies")
-    if interactive:
-        handle_inter(path, other_videos, category_map, series_pattern, common_subtitle_exts)
+        # Existing show folders by normalized title, listed once and kept up to date as series are planned
+        show_index = ShowIndex(category_map["s"], fuzzy=fuzzy_titles)
+
+        # Create destination directories
+        if not dry_run:
+            for dest in category_map.values():
+                dest.mkdir(parents=True, exist_ok=True)
+
+        def classify(source, items, subtitle_index, run_catalog):
+            """Classify the ScanItems of one source; returns it with its series, movies and other videos."""
+            series_dict = defaultdict(lambda: defaultdict(list))
+            movies = []
+            other_videos = []
+            unchanged = 0
+            for item in items:
+                record = catalog.lookup(item.entry if item.entry is not None else source / item.relpath)
+                if record is not None:
+                    if record.status == "moved":
+                        unchanged += 1
+                    else:
+                        restore_entry(record, series_dict, movies, other_videos, filename=item.relpath)
+                    continue
+                prepare_lists(item.relpath, source, series_dict, movies, other_videos, common_subtitle_exts=common_subtitle_exts, shows_json=shows_json, movies_json=movies_json, other_videos_json=other_videos_json, catalog=run_catalog, subtitle_index=subtitle_index, classifier=classifier, entry=item.entry, prober=prober)
+            if unchanged:
+                logger.info("Skipped %s files already processed in %s", unchanged, source, extra={"indent": 0})
+
+            # Sort lists
+            for series_title in series_dict:
+                for season in series_dict[series_title]:
+                    series_dict[series_title][season].sort(key=lambda x: x[0])
+            movies.sort(key=lambda x: x[0])
+            other_videos.sort(key=lambda x: x[0])
+            return source, series_dict, movies, other_videos
+
+        def organize(batches):
+            """
+            Classify, plan and move batches of (source, ScanItems, SubtitleIndex) as one plan, so moves from
+            every source are scheduled together; returns (source, series, movies, other videos) per source.
+            """
+            plan = MovePlan()
+            # A dry run keeps catalog writes in the plan until it is applied
+            run_catalog = DeferredCatalog(plan, catalog) if dry_run else catalog
+            found = [classify(source, items, subtitle_index, run_catalog) for source, items, subtitle_index in batches]
+            with metrics.phase("catalog_write"):
+                catalog.flush()
+            return place(found, plan)
+
+        def place(found, plan=None):
+            """Plan, deduplicate and move classified (source, series, movies, other videos) tuples; returns found."""
+            plan = plan if plan is not None else MovePlan()
+
+            # Plan all moves, with conflicts checked against one listing per destination folder
+            for source, series_dict, movies, other_videos in found:
+                plan_series(series_dict, source, category_map["s"], plan, show_index)
+                plan_items(movies, source, category_map["m"], "movies", plan)
+                if not interactive or dry_run:
+                    plan_items(other_videos, source, category_map["o"], "videos", plan)
+            if interactive and dry_run:
+                logger.warning("Interactive mode is skipped in a dry run; other videos are planned as-is", extra={"indent": 0})
+
+            # Skip or hardlink files already in the library (or twice in this batch) instead of copying them
+            if deduper is not None:
+                deduper.apply(plan)
+
+            if dry_run:
+                plan.dump(dry_run)
+                logger.info("Dry run: %s%s", plan.counts(), "" if dry_run == "-" else f", plan written to {dry_run}", extra={"indent": 0})
+                return found
+
+            # Move files
+            execute_plan(plan, scheduler, catalog, journal)
+            if interactive:
+                from vorganize import handle_inter
+                for source, _, _, other_videos in found:
+                    handle_inter(source, other_videos, category_map, common_subtitle_exts=common_subtitle_exts, catalog=catalog, classifier=classifier, scheduler=scheduler, show_index=show_index, journal=journal)
+            return found
+
+        def totals(found, series_titles=None, counts=(0, 0, 0)):
+            """Series titles and (episodes, movies, other videos) counts of found, added to earlier totals."""
+            series_titles = set() if series_titles is None else series_titles
+            series_titles.update(series_title for _, series_dict, _, _ in found for series_title in series_dict)
+            total_episodes, total_movies, total_others = counts
+            total_episodes += sum(len(episodes) for _, series_dict, _, _ in found for series in series_dict.values() for episodes in series.values())
+            total_movies += sum(len(movies) for _, _, movies, _ in found)
+            total_others += sum(len(other_videos) for _, _, _, other_videos in found)
+            return series_titles, (total_episodes, total_movies, total_others)
+
+        def summary(series_titles, counts):
+            logger.info("Summary: Processed %s series (%s episodes), %s movies, %s other videos", len(series_titles), *counts, extra={"indent": 0})
+
+        def organize_chunked(source, series_titles, counts):
+            """
+            Classify a source chunk by chunk and move each chunk as soon as it is classified, so memory and the
+            time to the first move stay bounded by chunk_size; returns the updated totals. With sort_all, the
+            chunks go into a spill-to-disk sorter instead and the whole source is moved batch by batch in the
+            usual order once it is classified.
+            """
+            from vorganize import ExternalSorter, chunks, to_entries, from_entries
+            logger.info("Scanning directory: %s (chunks of %s files)", source, chunk_size, extra={"indent": 0})
+            subtitle_index = SubtitleIndex(source, common_subtitle_exts)
+            items = scan_videos(source, video_ext, subtitle_index, max_depth=depth, ignore=ignore, forget_subtitles=False)
+            if not sort_all:
+                for chunk in chunks(metrics.timed("scan", items), chunk_size):
+                    # Sorted and grouped by season within the chunk; a season split across chunks lands in the same folder
+                    found = classify(source, chunk, subtitle_index, catalog)
+                    with metrics.phase("catalog_write"):
+                        catalog.flush()
+                    series_titles, counts = totals(place([found]), series_titles, counts)
+                    # Only videos already listed are moved, so the paused scan is not disturbed
+                    subtitle_index.keep_only(chunk[-1].relpath)
+                    show_index.forget_resolved()
+                return series_titles, counts
+            with ExternalSorter(int(memory_budget * 1024 * 1024)) as sorter:
+                for chunk in chunks(metrics.timed("scan", items), chunk_size):
+                    sorter.extend(to_entries(*classify(source, chunk, subtitle_index, catalog)))
+                    with metrics.phase("catalog_write"):
+                        catalog.flush()
+                    # The scan is paused in the folder of the last video; subtitles of finished folders can go
+                    subtitle_index.keep_only(chunk[-1].relpath)
+                logger.info("Classified %s videos in %s", sorter.count, source, extra={"indent": 0})
+                for batch in sorter.batches(chunk_size):
+                    series_titles, counts = totals(place([from_entries(batch)]), series_titles, counts)
+                    # Each raw title is resolved again in the next batch, from the show folders already known
+                    show_index.forget_resolved()
+            return series_titles, counts
+
+        def scan(source):
+            """Scan one source completely (run in a thread per source when there are several)."""
+            subtitle_index = SubtitleIndex(source, common_subtitle_exts)
+            with metrics.phase("scan"):
+                items = list(scan_videos(source, video_ext, subtitle_index, max_depth=depth, ignore=ignore, forget_subtitles=False))
+            logger.info("Found %s videos in %s", len(items), source, extra={"indent": 0})
+            return source, items, subtitle_index
+
+        if dedupe:
+            deduper = make_deduper(category_map.values(), dedupe, script_dir, jobs, dedupe_sample, video_ext)
+
+        watcher = None
+        if watch:
+            # Remember what is already there before the first pass, so files arriving during it are not missed
+            from vorganize import ArrivalWatcher
+            watcher = ArrivalWatcher(sources[0], video_ext, max_depth=depth, ignore=ignore, settle=settle, poll_interval=poll_interval)
+            watcher.prime()
+
+        with catalog:
+            # Process files
+            if chunk_size:
+                # Bounded memory: sources one after the other, each classified and moved in batches
+                series_titles, counts = None, (0, 0, 0)
+                for source in sources:
+                    series_titles, counts = organize_chunked(source, series_titles, counts)
+                summary(series_titles, counts)
+            elif len(sources) == 1:
+                # Classification starts while the single source is still being scanned
+                logger.info("Scanning directory: %s", sources[0], extra={"indent": 0})
+                subtitle_index = SubtitleIndex(sources[0], common_subtitle_exts)
+                items = scan_videos(sources[0], video_ext, subtitle_index, max_depth=depth, ignore=ignore)
+                summary(*totals(organize([(sources[0], metrics.timed("scan", items), subtitle_index)])))
+            else:
+                # Scan all sources concurrently, then classify and move everything as one run
+                logger.info("Scanning %s directories: %s", len(sources), ", ".join(map(str, sources)), extra={"indent": 0})
+                with ThreadPoolExecutor(len(sources), thread_name_prefix="vorganize-scan") as pool:
+                    batches = list(pool.map(scan, sources))
+                summary(*totals(organize(batches)))
+
+            if watcher is not None:
+                # Organize new arrivals as they settle, reusing the classifier, catalog and move scheduler
+                try:
+                    with watcher:
+                        for ready in watcher.batches():
+                            logger.info("%s new files in %s", len(ready), sources[0], extra={"indent": 0})
+                            subtitle_index = SubtitleIndex(sources[0], common_subtitle_exts)
+                            for relative_dir in {relpath.rpartition("/")[0] for relpath in ready}:
+                                subtitle_index.scan_dir(relative_dir)
+                            summary(*totals(organize([(sources[0], [ScanItem(relpath, None) for relpath in ready], subtitle_index)])))
+                            if metrics:
+                                metrics.write(metrics_out, metrics_textfile)
+                except KeyboardInterrupt:
+                    logger.info("Stopped watching", extra={"indent": 0})
+    except KeyboardInterrupt:
+        # Moves stopped by Ctrl+C were logged and the catalog saved on the way out; the journal is closed below
+        pass
+    finally:
+        if previous_sigterm is not None:
+            signal.signal(signal.SIGTERM, previous_sigterm)
+        if journal is not None:
+            journal.close()
+        if deduper is not None:
+            deduper.cache.close()
+        if metrics:
+            metrics.write(metrics_out, metrics_textfile)
+            logger.info("Metrics written to %s", ', '.join(f for f in (metrics_out, metrics_textfile) if f), extra={"indent": 0})
+            disable_metrics()
+
+
+def _human_size(size):
+    size = size or 0
+    return f"{size / 1024 ** 3:.1f} GB" if size >= 1024 ** 3 else f"{size / 1024 ** 2:.1f} MB"
+
+
+def query(index_db, command, show=None, season=None, days=7, dest_dir=None, rebuild=False, rules_file=None, jobs=8, as_json=False):
+    """Answer a library question from the episodes recorded in the index; returns an exit status."""
+    if not os.path.exists(index_db) and dest_dir is None:
+        logger.error("No index at %s: give -d/--dest to build it from the library", index_db, extra={"indent": 0})
+        return 1
+    from vorganize import LibraryIndex, LibraryQuery, parse_show, rebuild_episodes
+    classifier = Classifier.from_file(rules_file) if rules_file else Classifier()
+    with LibraryIndex(index_db, classifier=classifier) as index:
+        library = LibraryQuery(index)
+        if rebuild or (not len(library) and dest_dir is not None):
+            if dest_dir is None:
+                logger.error("--rebuild needs -d/--dest", extra={"indent": 0})
+                return 1
+            rebuild_episodes(index, Path(dest_dir) / "shows", classifier, workers=jobs)
+        elif not len(library):
+            logger.warning("No episodes indexed yet: run with --rebuild -d DEST, or organize with --index", extra={"indent": 0})
+
+        if show is not None:
+            title, show_season = parse_show(show)
+            season = season if season is not None else show_season
+            show = library.find_show(title)
+            if show is None:
+                logger.error("No show matching %s", title, extra={"indent": 0})
+                return 1
+
+        if command == "shows":
+            rows = library.shows()
+            lines = [f"{row.show}: {row.seasons} seasons, {row.episodes} episodes, {_human_size(row.size)}" for row in rows]
+        elif command == "episodes":
+            rows = library.episodes(show, season)
+            lines = [f"{row.show} S{row.season:02d}" + (f"E{row.episode:02d}" if row.episode is not None else "") + f"  {row.path}" for row in rows]
+        elif command == "gaps":
+            rows = library.gaps(show, season)
+            lines = [f"{row.show} S{row.season:02d}: missing " + ", ".join(f"E{episode:02d}" for episode in row.missing) + f" (up to E{row.last:02d})" for row in rows]
+        elif command == "recent":
+            rows = library.recent(time.time() - days * 86400)
+            lines = [time.strftime("%Y-%m-%d %H:%M", time.localtime(row.added)) + f"  {row.path}" for row in rows]
+        else:
+            rows = library.sizes(show)
+            lines = [f"{row.show} S{row.season:02d}: {row.episodes} episodes, {_human_size(row.size)}" for row in rows]
+            lines.append(f"Total: {sum(row.episodes for row in rows)} episodes, {_human_size(sum(row.size for row in rows))}")
+    if as_json:
+        print(json.dumps([row._asdict() for row in rows], indent=4))
     else:
-        move_items(other_videos, path, category_map["o"], item_type="videos")
+        print("\n".join(lines))
+    return 0
+
+
+def query_cli(argv):
+    """python main.py query ...: the library query subcommand."""
+    parser = argparse.ArgumentParser(
+        prog="main.py query",
+        description=textwrap.dedent(f"""
+        {Fore.CYAN}🔍 Library Query 🔍{Style.RESET_ALL}
+        List shows and episodes, find missing episodes, recent additions and sizes
+        from the index kept by --index, without walking the library.
+        """),
+        formatter_class=CustomHelpFormatter,
+        epilog=f"{Fore.MAGENTA}Example: python3 main.py query gaps \"Severance S02\" --index ~/library.db{Style.RESET_ALL}"
+    )
+    query_args_config = [
+        {
+            'flags': ['command'],
+            'choices': ['shows', 'episodes', 'gaps', 'recent', 'sizes'],
+            'help': 'What to list: shows, episodes, gaps (missing episodes), recent (additions) or sizes 📋'
+        },
+        {
+            'flags': ['show'],
+            'nargs': '?',
+            'help': 'Only this show, e.g. "Severance" or "Severance S02" 📺'
+        },
+        {
+            'flags': ['--index'],
+            'metavar': 'DB',
+            'required': True,
+            'help': 'SQLite index written by organizing with --index 🗃️'
+        },
+        {
+            'flags': ['--season'],
+            'type': int,
+            'metavar': 'N',
+            'help': 'Only this season 🔢'
+        },
+        {
+            'flags': ['--days'],
+            'type': float,
+            'default': 7,
+            'metavar': 'N',
+            'help': 'With recent, how many days back to look (default: 7) 📅'
+        },
+        {
+            'flags': ['-d', '--dest'],
+            'metavar': 'DIR',
+            'help': 'Organized library to scan when the index has no episodes yet, or with --rebuild 📁'
+        },
+        {
+            'flags': ['--rebuild'],
+            'action': 'store_true',
+            'help': 'Rescan the shows of -d/--dest in parallel and replace the indexed episodes 🔄'
+        },
+        {
+            'flags': ['-j', '--jobs'],
+            'type': int,
+            'default': 8,
+            'metavar': 'N',
+            'help': 'Show folders scanned in parallel by --rebuild (default: 8) ⚡'
+        },
+        {
+            'flags': ['--rules'],
+            'metavar': 'FILE',
+            'help': 'JSON file with filename classification rules, to read episode numbers 🧩'
+        },
+        {
+            'flags': ['--json'],
+            'action': 'store_true',
+            'help': 'Print the rows as JSON 🧾'
+        }
+    ]
+    for arg in query_args_config:
+        parser.add_argument(*arg['flags'], **{k: v for k, v in arg.items() if k != 'flags'})
+    args = parser.parse_args(argv)
+    return query(args.index, args.command, args.show, args.season, args.days, args.dest, args.rebuild, args.rules, args.jobs, args.json)
 
-    # Final summary
-    total_series = len(series_dict)
-    total_episodes = sum(len(episodes) for series in series_dict.values() for episodes in series.values())
-    total_movies = len(movies)
-    total_others = len(other_videos)
-    logger.info(f"Summary: Processed {total_series} series ({total_episodes} episodes), {total_movies} movies, {total_others} other videos", extra={"indent": 0})
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["query"]:
+        sys.exit(query_cli(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(
         description=textwrap.dedent(f"""
         {Fore.CYAN}🎥 Video File Organizer 🎥{Style.RESET_ALL}
@@ -120,14 +454,14 @@ if __name__ == "__main__":
     args_config = [
         {
             'flags': ['-s', '--source'],
-            'required': True,
             'metavar': 'DIR',
             'type': valid_dir,
-            'help': 'Source directory containing video files 📂'
+            'nargs': '+',
+            'action': 'extend',
+            'help': 'Source directories containing video files, scanned concurrently and organized together 📂'
         },
         {
             'flags': ['-d', '--dest'],
-            'required': True,
             'metavar': 'DIR',
             'type': valid_dir,
             'help': 'Destination directory to organize files into 📁'
@@ -136,6 +470,197 @@ if __name__ == "__main__":
             'flags': ['-i', '--interactive'],
             'action': 'store_true',
             'help': 'Enable interactive mode to rename files during processing ✍️'
+        },
+        {
+            'flags': ['--flush-every'],
+            'type': int,
+            'default': 500,
+            'metavar': 'N',
+            'help': 'Write the JSON catalog to disk every N new entries (0 = only at the end) 💾'
+        },
+        {
+            'flags': ['--index'],
+            'metavar': 'DB',
+            'help': 'Use a SQLite index instead of the JSON files to skip unchanged files and resume interrupted runs 🗃️'
+        },
+        {
+            'flags': ['--rules'],
+            'metavar': 'FILE',
+            'help': 'JSON file with filename classification rules replacing the built-in ones 🧩'
+        },
+        {
+            'flags': ['-j', '--jobs'],
+            'type': int,
+            'default': 4,
+            'metavar': 'N',
+            'help': 'Number of parallel moves between different disks (default: 4) ⚡'
+        },
+        {
+            'flags': ['--per-device'],
+            'type': int,
+            'default': 1,
+            'metavar': 'N',
+            'help': 'Maximum concurrent moves reading from or writing to one disk (default: 1) 💽'
+        },
+        {
+            'flags': ['--max-rate'],
+            'type': float,
+            'metavar': 'MB/S',
+            'help': 'Limit data copied between disks to this many MB per second (default: unlimited) 🐢'
+        },
+        {
+            'flags': ['--max-files'],
+            'type': float,
+            'metavar': 'N/S',
+            'help': 'Limit moves to this many files per second (default: unlimited) 🐢'
+        },
+        {
+            'flags': ['--link-mode'],
+            'choices': ['move', 'hardlink', 'reflink', 'symlink', 'auto'],
+            'default': 'move',
+            'help': 'How files are put in place: move them, or link them and leave the source untouched; auto links when possible and moves otherwise (default: move) 🔗'
+        },
+        {
+            'flags': ['--verify'],
+            'action': 'store_true',
+            'help': 'Check size and sampled block hashes of files copied between disks before deleting the source ✅'
+        },
+        {
+            'flags': ['--depth'],
+            'type': int,
+            'default': 4,
+            'metavar': 'N',
+            'help': 'How many folder levels below the source to scan (default: 4, 0 = only the source folder) 🌲'
+        },
+        {
+            'flags': ['--ignore'],
+            'action': 'append',
+            'metavar': 'GLOB',
+            'help': 'Skip files or folders (with a trailing /) matching GLOB; repeatable (default: ' + ' '.join(default_ignore) + ') 🙈'
+        },
+        {
+            'flags': ['--dry-run'],
+            'nargs': '?',
+            'const': '-',
+            'metavar': 'PLAN',
+            'help': 'Only plan the moves and write the plan as JSON to PLAN (default: stdout) 📝'
+        },
+        {
+            'flags': ['--apply'],
+            'metavar': 'PLAN',
+            'help': 'Execute a plan written by --dry-run instead of scanning the source ▶️'
+        },
+        {
+            'flags': ['--watch'],
+            'action': 'store_true',
+            'help': 'Keep running after the first pass and organize new downloads as they finish 👀'
+        },
+        {
+            'flags': ['--settle'],
+            'type': float,
+            'default': 10,
+            'metavar': 'SECONDS',
+            'help': 'With --watch, wait until a file size has not changed for this long (default: 10) ⏳'
+        },
+        {
+            'flags': ['--poll-interval'],
+            'type': float,
+            'default': 30,
+            'metavar': 'SECONDS',
+            'help': 'With --watch, how often to look for changes when inotify is not available (default: 30) 🔄'
+        },
+        {
+            'flags': ['--metrics-out'],
+            'metavar': 'FILE',
+            'help': 'Write per-phase timings and counters (files, bytes moved, stat calls) as JSON to FILE 📊'
+        },
+        {
+            'flags': ['--metrics-textfile'],
+            'metavar': 'FILE',
+            'help': 'Write the same metrics in Prometheus textfile-collector format to FILE (e.g. vorganize.prom) 📈'
+        },
+        {
+            'flags': ['--profile'],
+            'metavar': 'FILE',
+            'help': 'Run under cProfile and write the stats to FILE (read them with python -m pstats FILE) 🔬'
+        },
+        {
+            'flags': ['--log-level'],
+            'choices': ['debug', 'info', 'warning', 'error'],
+            'type': str.lower,
+            'help': 'Minimum level of log messages (default: debug on a terminal, info otherwise) 🔊'
+        },
+        {
+            'flags': ['--log-json'],
+            'metavar': 'FILE',
+            'help': 'Also write every log record as one JSON object per line to FILE 🧾'
+        },
+        {
+            'flags': ['--headless'],
+            'action': 'store_true',
+            'help': 'Plain log lines without colors or progress bars (automatic when stdout is not a terminal) 🤖'
+        },
+        {
+            'flags': ['--dedupe'],
+            'choices': ['skip', 'hardlink'],
+            'help': 'Detect videos already in the destination (or twice in the source) by size and partial hash, and skip them or hardlink the existing copy instead of copying 👯'
+        },
+        {
+            'flags': ['--dedupe-sample'],
+            'type': float,
+            'default': 4,
+            'metavar': 'MB',
+            'help': 'With --dedupe, how many MB at the start and at the end of a file are hashed (default: 4) #️⃣'
+        },
+        {
+            'flags': ['--fuzzy-titles'],
+            'type': float,
+            'nargs': '?',
+            'const': 0.85,
+            'metavar': 'CUTOFF',
+            'help': 'File series under an existing show folder with a similar title (similarity 0-1, default: 0.85) 🔎'
+        },
+        {
+            'flags': ['--probe'],
+            'action': 'store_true',
+            'help': 'Read the headers of MKV/MP4 files matching no naming rule to classify them by embedded title or duration 🔬'
+        },
+        {
+            'flags': ['--movie-minutes'],
+            'type': float,
+            'default': 70,
+            'metavar': 'MIN',
+            'help': 'With --probe, videos at least this long are movies (default: 70) ⏱️'
+        },
+        {
+            'flags': ['--recover'],
+            'action': 'store_true',
+            'help': 'Finish or roll back the moves of runs that died (crash, reboot, kill) from their journals, then run as usual if -s/-d are given 🩹'
+        },
+        {
+            'flags': ['--undo'],
+            'nargs': '?',
+            'const': 'last',
+            'metavar': 'RUN_ID',
+            'help': 'Put back every file moved by a run (default: the last one) and remove the folders it created ↩️'
+        },
+        {
+            'flags': ['--chunk-size'],
+            'type': int,
+            'metavar': 'N',
+            'help': 'Bounded memory for huge libraries: classify N files at a time and move each chunk right away, sources one after the other 🧱'
+        },
+        {
+            'flags': ['--sort-all'],
+            'action': 'store_true',
+            'help': 'With --chunk-size, classify a whole source before moving it, so it moves in the usual order one season at a time (moves start later) 🔀'
+        },
+        {
+            'flags': ['--memory-budget'],
+            'type': float,
+            'default': 256,
+            'metavar': 'MB',
+            'help': 'With --chunk-size --sort-all, sort classified files in memory up to this size and spill the rest to temporary files (default: 256) 🪣'
         }
     ]
 
@@ -143,4 +668,33 @@ if __name__ == "__main__":
         parser.add_argument(*arg['flags'], **{k: v for k, v in arg.items() if k != 'flags'})
 
     args = parser.parse_args()
-    main(args.source, args.dest, args.interactive)
\ No newline at end of file
+    setup_logging(args.log_level, True if args.headless else None, args.log_json)
+    if not (args.apply or args.undo or args.recover) and not (args.source and args.dest):
+        parser.error("the following arguments are required: -s/--source, -d/--dest (unless --apply, --undo or --recover is used)")
+    if args.watch and (args.apply or args.dry_run or args.interactive):
+        parser.error("--watch cannot be combined with --apply, --dry-run or -i/--interactive")
+    if args.watch and not (args.source and args.dest):
+        parser.error("--watch requires -s/--source and -d/--dest")
+    if args.watch and len(args.source) > 1:
+        parser.error("--watch takes a single -s/--source")
+    if args.chunk_size is not None and (args.chunk_size < 1 or args.dry_run or args.watch):
+        parser.error("--chunk-size must be at least 1 and cannot be combined with --dry-run or --watch")
+    if args.sort_all and args.chunk_size is None:
+        parser.error("--sort-all requires --chunk-size")
+    if args.chunk_size is not None and not args.index:
+        logger.warning("--chunk-size without --index keeps every JSON catalog entry in memory: add --index DB to bound memory", extra={"indent": 0})
+    if args.chunk_size is not None and args.dedupe:
+        logger.warning("--chunk-size with --dedupe keeps the size and path of every library video in memory", extra={"indent": 0})
+    if args.fuzzy_titles is not None and not 0 < args.fuzzy_titles <= 1:
+        parser.error("--fuzzy-titles must be between 0 and 1")
+    run_args = (args.source, args.dest, args.interactive)
+    run_kwargs = dict(flush_every=args.flush_every, index_db=args.index, rules_file=args.rules, jobs=args.jobs, per_device=args.per_device, max_rate=args.max_rate, max_files=args.max_files, link_mode=args.link_mode, verify=args.verify, depth=args.depth, ignore=args.ignore or default_ignore, dry_run=args.dry_run, apply_plan=args.apply, watch=args.watch, settle=args.settle, poll_interval=args.poll_interval, metrics_out=args.metrics_out, metrics_textfile=args.metrics_textfile, dedupe=args.dedupe, dedupe_sample=args.dedupe_sample, fuzzy_titles=args.fuzzy_titles, probe=args.probe, movie_minutes=args.movie_minutes, recover=args.recover, undo=args.undo, chunk_size=args.chunk_size, memory_budget=args.memory_budget, sort_all=args.sort_all)
+    if args.profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(main, *run_args, **run_kwargs)
+        finally:
+            profiler.dump_stats(args.profile)
+            logger.info("Profile written to %s", args.profile, extra={"indent": 0})
+    else:
+        main(*run_args, **run_kwargs)
\ No newline at end of file
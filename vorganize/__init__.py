@@ -1,14 +1,156 @@
-from .core import extract_series_title, find_subtitle
-from .organize import prepare_lists, move_series, move_items
-from .storage import store_as_json
-from .interactive import handle_inter
+import importlib
+
+# Public names and the submodule defining them. Submodules are imported on first use, so e.g. a
+# non-interactive run never loads interactive.py (and colorama), and headless runs never load tqdm.
+_exports = {
+    "extract_series_title": "core",
+    "find_subtitle": "core",
+    "SubtitleIndex": "core",
+    "Classifier": "core",
+    "VIDEO_EXTS": "core",
+    "common_subtitle_exts": "core",
+    "MediaInfo": "core",
+    "prepare_lists": "organize",
+    "restore_entry": "organize",
+    "move_series": "organize",
+    "move_items": "organize",
+    "plan_series": "organize",
+    "plan_items": "organize",
+    "execute_plan": "organize",
+    "store_as_json": "storage",
+    "JsonCatalog": "storage",
+    "scan_videos": "scanner",
+    "default_ignore": "scanner",
+    "ScanItem": "scanner",
+    "LibraryIndex": "index",
+    "MovePlan": "plan",
+    "PlanOp": "plan",
+    "DeferredCatalog": "plan",
+    "MoveScheduler": "executor",
+    "MoveJob": "executor",
+    "MoveResult": "executor",
+    "Throttle": "executor",
+    "ArrivalWatcher": "watch",
+    "Metrics": "metrics",
+    "get_metrics": "metrics",
+    "enable_metrics": "metrics",
+    "disable_metrics": "metrics",
+    "handle_inter": "interactive",
+    "InteractiveResult": "interactive",
+    "setup_logging": "console",
+    "progress_bar": "console",
+    "is_headless": "console",
+    "Organizer": "organizer",
+    "OrganizeResult": "organizer",
+    "library_folders": "organizer",
+    "open_catalog": "organizer",
+    "make_scheduler": "organizer",
+    "make_deduper": "organizer",
+    "make_prober": "organizer",
+    "LibraryQuery": "query",
+    "rebuild_episodes": "query",
+    "parse_show": "query",
+    "Entry": "chunked",
+    "ExternalSorter": "chunked",
+    "chunks": "chunked",
+    "to_entries": "chunked",
+    "from_entries": "chunked",
+    "Journal": "journal",
+    "recover_runs": "journal",
+    "undo_run": "journal",
+    "unfinished_runs": "journal",
+    "list_runs": "journal",
+    "prune_runs": "journal",
+    "Prober": "probe",
+    "ProbeInfo": "probe",
+    "probe_file": "probe",
+    "ShowIndex": "titles",
+    "normalize_title": "titles",
+    "strip_season": "titles",
+    "Deduper": "dedupe",
+    "FingerprintCache": "dedupe",
+    "fingerprint": "dedupe",
+}
 
 __all__ = [
     "extract_series_title",
     "find_subtitle",
+    "SubtitleIndex",
+    "Classifier",
+    "VIDEO_EXTS",
+    "common_subtitle_exts",
+    "MediaInfo",
     "prepare_lists",
+    "restore_entry",
     "move_series",
     "move_items",
+    "plan_series",
+    "plan_items",
+    "execute_plan",
+    "MovePlan",
+    "PlanOp",
+    "DeferredCatalog",
     "store_as_json",
-    "handle_inter"
-]
\ No newline at end of file
+    "JsonCatalog",
+    "scan_videos",
+    "default_ignore",
+    "ScanItem",
+    "LibraryIndex",
+    "MoveScheduler",
+    "MoveJob",
+    "MoveResult",
+    "Throttle",
+    "ArrivalWatcher",
+    "Metrics",
+    "get_metrics",
+    "enable_metrics",
+    "disable_metrics",
+    "setup_logging",
+    "progress_bar",
+    "is_headless",
+    "Organizer",
+    "OrganizeResult",
+    "library_folders",
+    "open_catalog",
+    "make_scheduler",
+    "make_deduper",
+    "make_prober",
+    "LibraryQuery",
+    "rebuild_episodes",
+    "parse_show",
+    "Entry",
+    "ExternalSorter",
+    "chunks",
+    "to_entries",
+    "from_entries",
+    "Journal",
+    "recover_runs",
+    "undo_run",
+    "unfinished_runs",
+    "list_runs",
+    "prune_runs",
+    "Prober",
+    "ProbeInfo",
+    "probe_file",
+    "ShowIndex",
+    "normalize_title",
+    "strip_season",
+    "Deduper",
+    "FingerprintCache",
+    "fingerprint",
+    "handle_inter",
+    "InteractiveResult",
+]
+
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,174 @@
+import heapq
+import json
+import logging
+import os
+import sys
+import tempfile
+from collections import defaultdict
+from itertools import islice
+from pathlib import Path
+from .core import subtitle_list
+from .metrics import get_metrics
+"""_summary_:
+Bounded-memory processing.
+This module lets a run over millions of files classify and move them in batches instead of holding the whole
+inventory. Classified files become compact Entry records (__slots__, interned titles and folders) that are
+kept in memory up to a byte budget; beyond it they are sorted and spilled to a temporary file, and the sorted
+runs are merged back lazily with heapq.merge. The merged stream is in the same order as a normal run (series
+by title and season, then movies, then other videos, each by name) and is cut into batches at series/season
+boundaries, so every batch is planned and moved like a small run while memory stays flat.
+"""
+
+logger = logging.getLogger(__name__)
+
+KIND_ORDER = {"s": 0, "m": 1, "o": 2}
+# Rough size of an Entry with its tuple and list slots, on top of its strings
+ENTRY_OVERHEAD = 160
+
+
+class Entry:
+    """One classified file: kind, series title and season (series only), filename relative to source, subtitles."""
+
+    __slots__ = ("source", "kind", "title", "season", "filename", "subtitle")
+
+    def __init__(self, source, kind, title, season, filename, subtitle):
+        self.source = sys.intern(source)
+        self.kind = kind
+        self.title = sys.intern(title) if title is not None else None
+        self.season = season
+        self.filename = filename
+        self.subtitle = tuple(subtitle_list(subtitle)) or None
+
+    def sort_key(self):
+        return (self.source, KIND_ORDER[self.kind], self.title or "", self.season or 0, self.filename)
+
+    def group(self):
+        """Entries of one group are planned together: a series season, or all movies or other videos of a source."""
+        return (self.source, self.kind, self.title, self.season)
+
+    def size(self):
+        return ENTRY_OVERHEAD + len(self.filename) + sum(len(name) for name in self.subtitle or ())
+
+    def to_row(self):
+        return [self.source, self.kind, self.title, self.season, self.filename, self.subtitle]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+def to_entries(source, series_dict, movies, other_videos):
+    """Entries for the series_dict/movies/other_videos lists filled by prepare_lists for one source."""
+    source = os.fspath(source)
+    for title, seasons in series_dict.items():
+        for season, episodes in seasons.items():
+            for filename, subtitle in episodes:
+                yield Entry(source, "s", title, season, filename, subtitle)
+    for kind, items in (("m", movies), ("o", other_videos)):
+        for filename, subtitle in items:
+            yield Entry(source, kind, None, None, filename, subtitle)
+
+
+def from_entries(entries):
+    """(source, series_dict, movies, other_videos) for a batch of entries of one source."""
+    series_dict = defaultdict(lambda: defaultdict(list))
+    lists = {"m": [], "o": []}
+    for entry in entries:
+        item = (entry.filename, list(entry.subtitle) if entry.subtitle else None)
+        if entry.kind == "s":
+            series_dict[entry.title][entry.season].append(item)
+        else:
+            lists[entry.kind].append(item)
+    return Path(entries[0].source), series_dict, lists["m"], lists["o"]
+
+
+class ExternalSorter:
+    """
+    Sort Entries within a memory budget (bytes): entries over the budget are sorted and spilled
+    to temporary files, which sorted() merges back lazily.
+    """
+
+    def __init__(self, budget=256 * 1024 * 1024, tmp_dir=None):
+        self.budget = budget
+        self.tmp_dir = tmp_dir
+        self.count = 0
+        self._entries = []
+        self._size = 0
+        self._runs = []
+
+    def add(self, entry):
+        self._entries.append(entry)
+        self._size += entry.size()
+        self.count += 1
+        if self._size >= self.budget:
+            self._spill()
+
+    def extend(self, entries):
+        for entry in entries:
+            self.add(entry)
+
+    def _spill(self):
+        self._entries.sort(key=Entry.sort_key)
+        run = tempfile.TemporaryFile("w+", encoding="utf-8", dir=self.tmp_dir, prefix="vorganize-run-")
+        for entry in self._entries:
+            run.write(json.dumps(entry.to_row(), ensure_ascii=False) + "\n")
+        run.flush()
+        self._runs.append(run)
+        logger.debug("Spilled %s entries to disk (run %s)", len(self._entries), len(self._runs), extra={"indent": 2})
+        get_metrics().add("sort_runs_spilled")
+        self._entries = []
+        self._size = 0
+
+    @staticmethod
+    def _read(run):
+        run.seek(0)
+        for line in run:
+            yield Entry.from_row(json.loads(line))
+
+    def sorted(self):
+        """Iterate over every entry added, in sort_key order."""
+        self._entries.sort(key=Entry.sort_key)
+        if not self._runs:
+            return iter(self._entries)
+        return heapq.merge(iter(self._entries), *(self._read(run) for run in self._runs), key=Entry.sort_key)
+
+    def batches(self, size):
+        """
+        Lists of sorted entries of one source, cut at the first group boundary once size is reached
+        (or at 4 * size inside a very large group, e.g. all other videos).
+        """
+        batch = []
+        for entry in self.sorted():
+            if batch and (
+                entry.source != batch[-1].source
+                or (len(batch) >= size and entry.group() != batch[-1].group())
+                or len(batch) >= 4 * size
+            ):
+                yield batch
+                batch = []
+            batch.append(entry)
+        if batch:
+            yield batch
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def chunks(iterable, size):
+    """Lists of up to size items from iterable, consumed lazily."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
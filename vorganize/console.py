@@ -0,0 +1,158 @@
+import json
+import logging
+import sys
+"""_summary_:
+Console output.
+This module sets up logging and progress bars for either a terminal or a headless run (cron, systemd, a pipe).
+On a terminal, log lines are colored with colorama and moves show a tqdm progress bar; headless runs use plain
+lines, no progress bars, and never import colorama or tqdm. Log calls use deferred %-style arguments, so
+messages below the configured level are never formatted. An optional JSON-lines log can be written next to
+either console output.
+"""
+
+BAR_FORMAT = "{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}]"
+
+_progress = None  # None: show progress bars when stderr is a terminal
+
+
+def is_headless(stream=None):
+    """True when stream (default: stdout) is not a terminal."""
+    stream = stream or sys.stdout
+    try:
+        return not stream.isatty()
+    except (AttributeError, ValueError):
+        return True
+
+
+def set_progress(enabled):
+    """Force progress bars on or off (None: only when stderr is a terminal)."""
+    global _progress
+    _progress = enabled
+
+
+class _NullProgress:
+    """Stand-in for tqdm when progress bars are off."""
+
+    def __init__(self, iterable=None):
+        self.iterable = iterable
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def update(self, n=1):
+        pass
+
+    def set_postfix_str(self, s=""):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+def progress_bar(iterable=None, total=None, desc=None, unit="file"):
+    """A tqdm progress bar, or a no-op one in headless runs; tqdm is only imported when it is shown."""
+    enabled = _progress if _progress is not None else not is_headless(sys.stderr)
+    if not enabled:
+        return _NullProgress(iterable)
+    from tqdm import tqdm
+
+    return tqdm(iterable, total=total, desc=desc, unit=unit, bar_format=BAR_FORMAT)
+
+
+class _NoColor:
+    """colorama.Fore/Style replacement whose colors are empty strings."""
+
+    def __getattr__(self, name):
+        return ""
+
+
+def colors(headless=None):
+    """(Fore, Style) from colorama on a terminal, or empty color codes when headless."""
+    if headless if headless is not None else is_headless():
+        return _NoColor(), _NoColor()
+    from colorama import Fore, Style
+
+    return Fore, Style
+
+
+class PlainFormatter(logging.Formatter):
+    """Indented, uncolored log lines."""
+
+    def format(self, record):
+        return "  " * getattr(record, "indent", 0) + record.getMessage()
+
+
+class ColorFormatter(logging.Formatter):
+    """Indented log lines colored by level."""
+
+    def __init__(self):
+        super().__init__()
+        import colorama
+        from colorama import Fore, Style
+
+        colorama.init(autoreset=True)
+        self.reset = Style.RESET_ALL
+        self.colors = {
+            logging.INFO: Fore.GREEN,
+            logging.WARNING: Fore.YELLOW,
+            logging.ERROR: Fore.RED,
+            logging.DEBUG: Fore.BLUE,
+        }
+
+    def format(self, record):
+        indent = "  " * getattr(record, "indent", 0)
+        color = self.colors.get(record.levelno)
+        if color is None:
+            return f"{indent}{record.getMessage()}"
+        return f"{indent}{color}{record.getMessage()}{self.reset}"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger and message."""
+
+    def format(self, record):
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level=None, headless=None, json_log=None):
+    """
+    Configure the root logger for a terminal or a headless run (auto-detected when headless is None).
+    level defaults to DEBUG on a terminal and INFO when headless; json_log is a file for JSON-lines records.
+    """
+    if headless is None:
+        headless = is_headless()
+    if level is None:
+        level = logging.INFO if headless else logging.DEBUG
+    elif isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    set_progress(False if headless else None)
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(PlainFormatter() if headless else ColorFormatter())
+    handlers = [handler]
+    if json_log:
+        json_handler = logging.FileHandler(json_log, encoding="utf-8")
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+
+    root = logging.getLogger()
+    for old in root.handlers:
+        if old not in handlers:
+            old.close()
+    root.handlers = handlers
+    root.setLevel(level)
+    return headless
@@ -1,13 +1,131 @@
+import json
 import logging
+import os
 import re
+from collections import defaultdict, namedtuple
 from pathlib import Path
 
+from .metrics import get_metrics
+
+VIDEO_EXTS = ("mp4", "avi", "mkv", "mov", "wmv")
 common_subtitle_exts = ["srt", "sub", "idx", "ssa", "ass", "vtt", "smi", "sami", "stl"]
+subtitle_dirs = ["subs", "subtitles", "sub"]
 logger = logging.getLogger(__name__)
 
+# Trailing name parts that may follow the video stem in a subtitle name, e.g. Movie.en.srt, Movie.fr.forced.srt
+_subtitle_tag = re.compile(
+    r"^(?:[a-z]{2}(?:[-_][a-z]{2,4})?"
+    r"|eng|fre|fra|ger|deu|spa|ita|por|rus|jpn|kor|chi|zho|ara|hin|dut|nld|swe|nor|dan|fin|pol|tur|gre|ell"
+    r"|heb|hun|cze|ces|rum|ron|tha|vie|ind|may|msa|ukr|und"
+    r"|forced|sdh|cc|hi|default|full)$",
+    re.IGNORECASE,
+)
+
+
+def subtitle_list(subtitle_file):
+    """Normalize a subtitle entry (None, one name or several names) to a list of names."""
+    if not subtitle_file:
+        return []
+    if isinstance(subtitle_file, (str, os.PathLike)):
+        return [os.fspath(subtitle_file)]
+    return list(subtitle_file)
+
+
+class SubtitleIndex:
+    """
+    Maps video stems to subtitle files, per directory relative to `path`.
+    Built from a single os.scandir pass over the directory (and Subs/-style subfolders)
+    instead of one exists() call per extension per video. Subtitles in a Subs/ folder
+    belong to the videos of the folder that contains it.
+    """
+
+    def __init__(self, path, common_subtitle_exts=common_subtitle_exts):
+        self.path = Path(path)
+        self.exts = {ext.lower() for ext in common_subtitle_exts}
+        self._by_dir = defaultdict(lambda: defaultdict(list))
+
+    @classmethod
+    def scan(cls, path, common_subtitle_exts=common_subtitle_exts):
+        """Build an index of path and its subtitle subfolders in one pass."""
+        index = cls(path, common_subtitle_exts)
+        index.scan_dir("")
+        return index
 
-def find_subtitle(filename, path, common_subtitle_exts=common_subtitle_exts):
-    """Find a subtitle file for the given video filename."""
+    def scan_dir(self, relative_dir):
+        """Add the subtitles of one folder below path (and of its Subs/-style subfolders)."""
+        directory = self.path / relative_dir if relative_dir else self.path
+        prefix = f"{relative_dir}/" if relative_dir else ""
+        get_metrics().add("scandir_calls")
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir() and entry.name.lower() in subtitle_dirs:
+                        self.scan_subdir(entry, prefix)
+                    else:
+                        self.add(prefix + entry.name)
+        except OSError as e:
+            logger.error("Failed to scan %s for subtitles: %s", directory, e, extra={"indent": 2})
+
+    def scan_subdir(self, dir_entry, prefix=""):
+        """Add every file of a Subs/-style folder; prefix is the folder's parent relative to path."""
+        get_metrics().add("scandir_calls")
+        try:
+            with os.scandir(dir_entry.path) as entries:
+                for entry in entries:
+                    self.add(f"{prefix}{dir_entry.name}/{entry.name}")
+        except OSError as e:
+            logger.error("Failed to scan %s for subtitles: %s", dir_entry.path, e, extra={"indent": 2})
+
+    @staticmethod
+    def _directory(relname):
+        parts = relname.split("/")[:-1]
+        if parts and parts[-1].lower() in subtitle_dirs:
+            parts.pop()
+        return "/".join(parts)
+
+    def add(self, relname):
+        """Index a file given relative to the directory; non-subtitle files are ignored."""
+        directory, _, name = relname.rpartition("/")
+        stem, _, ext = name.rpartition(".")
+        if not stem or ext.lower() not in self.exts:
+            return
+        parts = stem.split(".")
+        keys = [stem]
+        while len(parts) > 1 and len(keys) <= 3 and _subtitle_tag.match(parts[-1]):
+            parts.pop()
+            keys.append(".".join(parts))
+        by_stem = self._by_dir[self._directory(relname)]
+        for key in keys:
+            by_stem[key.casefold()].append(relname)
+
+    def forget(self, directory):
+        """Drop the subtitles of a directory whose videos have all been looked up."""
+        self._by_dir.pop(directory, None)
+
+    def keep_only(self, relname):
+        """Drop the subtitles of every directory but the one of relname (e.g. the last video a paused scan yielded)."""
+        directory = self._directory(relname)
+        kept = self._by_dir.get(directory)
+        self._by_dir.clear()
+        if kept is not None:
+            self._by_dir[directory] = kept
+
+    def lookup(self, filename):
+        """Return every subtitle for the video filename (relative to path), exact stem matches first."""
+        directory, _, name = filename.rpartition("/")
+        stem = name.rpartition(".")[0] or name
+        by_stem = self._by_dir.get(directory)
+        matches = by_stem.get(stem.casefold()) if by_stem else None
+        if not matches:
+            return ()
+        return tuple(sorted(set(matches), key=lambda sub: (len(sub), sub)))
+
+
+def find_subtitle(filename, path, common_subtitle_exts=common_subtitle_exts, index=None):
+    """Find a subtitle file for the given video filename, using a SubtitleIndex when one is given."""
+    if index is not None:
+        matches = index.lookup(filename)
+        return matches[0] if matches else None
     base_name = ".".join(filename.split(".")[:-1])  # Remove the extension
     for ext in common_subtitle_exts:
         subtitle_file = f"{base_name}.{ext}"
@@ -35,3 +153,130 @@ def extract_series_title(filename, pattern):
             return (title, season)
     return None
 
+
+
+MediaInfo = namedtuple("MediaInfo", "kind title season episode year resolution codec")
+
+# Rules are tried in order at the start of the name; the first that matches decides the kind.
+# "s" = tv-show episode, "m" = movie. Names matching no rule are "o" (other videos).
+default_rules = [
+    # e.g. Breaking Bad S01E01, Severance.S02E01, Alice in borderland S03 E05, Show S01.01, Show Season 1 Episode 2
+    {
+        "kind": "s",
+        "pattern": r"(?P<title>.*?)[\s._-]*(?<![a-z])(?:S|Season[\s._-]*)(?P<season>\d{1,2})[\s._-]*(?:E|Episode[\s._-]*|x|\.|-)(?P<episode>(?<=e)\d{4}|\d{1,3})(?!\d)",
+    },
+    # e.g. Show 1x01
+    {
+        "kind": "s",
+        "pattern": r"(?P<title>.+?)[\s._-]+(?P<season>\d{1,2})x(?P<episode>\d{2,3})(?!\d)",
+    },
+    # e.g. Inception (2010).mp4
+    {
+        "kind": "m",
+        "pattern": r"(?P<title>.+?)\s*\((?P<year>\d{4})\)",
+    },
+    # e.g. The.Matrix.1999.1080p.BluRay.x264.mkv
+    {
+        "kind": "m",
+        "pattern": r"(?P<title>[\w\s\-\.]+?)\.(?P<year>\d{4})(?:\.[\w\-\.\[\]]+)?\.(?:mkv|mp4)$",
+    },
+    # e.g. The_Matrix_1999_1080p.mkv
+    {
+        "kind": "m",
+        "pattern": r"(?P<title>[\w\s\-\.]+?)_(?P<year>\d{4})_[\w\-\.]+?\.(?:mkv|mp4)$",
+    },
+]
+
+_tags = re.compile(
+    r"(?<![a-z0-9])(?:"
+    r"(?P<resolution>2160p|1080p|720p|576p|480p|4k|uhd)"
+    r"|(?P<codec>x\.?264|x\.?265|h\.?264|h\.?265|hevc|avc|av1|xvid|divx|vp9)"
+    r"|(?P<year>(?:19|20)\d{2})"
+    r")(?![a-z0-9])",
+    re.IGNORECASE,
+)
+_group_name = re.compile(r"\(\?P(?P<kind>[<=])(?P<name>\w+)")
+_title_separators = re.compile(r"[._-]+")
+
+
+class Classifier:
+    """
+    Compiled filename classifier.
+    All rules are joined into one anchored regex so each name is matched in a single call,
+    and the result is returned as a MediaInfo(kind, title, season, episode, year, resolution, codec).
+    """
+
+    def __init__(self, rules=None):
+        self.rules = list(default_rules if rules is None else rules)
+        alternatives = []
+        self._kinds = {}
+        for i, rule in enumerate(self.rules):
+            if rule["kind"] not in ("s", "m", "o"):
+                raise ValueError(f"Invalid rule kind {rule['kind']!r} (expected s, m or o)")
+            re.compile(rule["pattern"])  # Report a broken rule on its own before it is combined
+            prefix = f"r{i}_"
+            pattern = _group_name.sub(
+                lambda m: f"(?P{m.group('kind')}{prefix}{m.group('name')}", rule["pattern"]
+            )
+            alternatives.append(f"(?P<r{i}>{pattern})")
+            self._kinds[f"r{i}"] = (rule["kind"], prefix)
+        self._regex = re.compile("^(?:" + "|".join(alternatives) + ")", re.IGNORECASE) if alternatives else None
+
+    @classmethod
+    def from_file(cls, rules_file):
+        """Load rules from a JSON file: {"rules": [{"kind": "s", "pattern": "..."}, ...]}."""
+        with open(rules_file, "r") as f:
+            config = json.load(f)
+        rules = config["rules"] if isinstance(config, dict) else config
+        return cls(rules)
+
+    def classify(self, filename):
+        """Classify one filename and return its MediaInfo."""
+        year = resolution = codec = None
+        for tag in _tags.finditer(filename):
+            group = tag.lastgroup
+            if group == "year":
+                year = int(tag.group(group))
+            elif group == "resolution" and resolution is None:
+                resolution = tag.group(group).lower()
+            elif group == "codec" and codec is None:
+                codec = tag.group(group).lower().replace(".", "")
+
+        m = self._regex.match(filename) if self._regex is not None else None
+        if m is None:
+            return MediaInfo("o", None, None, None, year, resolution, codec)
+
+        # The rule wrapper group closes after its inner groups, so it is always the last group
+        kind, prefix = self._kinds[m.lastgroup]
+        groups = {
+            name[len(prefix):]: value
+            for name, value in m.groupdict().items()
+            if value is not None and name.startswith(prefix)
+        }
+        title = groups.get("title")
+        if title is not None:
+            title = _title_separators.sub(" ", title).strip()
+        if kind == "s" and not title:
+            # e.g. "S01E01.mkv": no series title to file the episode under
+            return MediaInfo("o", None, None, None, year, resolution, codec)
+        season = int(groups["season"]) if "season" in groups else None
+        episode = int(groups["episode"]) if "episode" in groups else None
+        if "year" in groups:
+            year = int(groups["year"])
+        return MediaInfo(kind, title or None, season, episode, year, resolution, codec)
+
+    def classify_batch(self, filenames):
+        """Classify a list of filenames, returning MediaInfo records in the same order."""
+        classify = self.classify
+        return [classify(filename) for filename in filenames]
+
+
+_default_classifier = None
+
+
+def default_classifier():
+    """Return the shared Classifier built from default_rules."""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = Classifier()
+    return _default_classifier
@@ -0,0 +1,208 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .core import VIDEO_EXTS
+from .index import BUSY_TIMEOUT
+from .metrics import get_metrics
+from .plan import PlanOp
+"""_summary_:
+Duplicate detection.
+This module finds planned video moves whose file is already in the destination library or appears twice in the
+same batch (re-downloads under another name). Candidates are first grouped by size, which rules out almost
+everything for the price of one stat; only files sharing a size are fingerprinted, by hashing their first and
+last few MB in parallel. Fingerprints are cached by device/inode/size/mtime, so library files are read once.
+Duplicates are then skipped, or hardlinked to the existing copy instead of being copied again.
+"""
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_MODES = ("skip", "hardlink")
+SAMPLE_BYTES = 4 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sample INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (device, inode)
+);
+"""
+
+
+def fingerprint(path, size, sample=SAMPLE_BYTES):
+    """blake2b of the size and the first and last `sample` bytes (the whole file when it is smaller)."""
+    digest = hashlib.blake2b(str(size).encode())
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if size <= 2 * sample:
+            digest.update(os.pread(fd, size, 0))
+        else:
+            digest.update(os.pread(fd, sample, 0))
+            digest.update(os.pread(fd, sample, size - sample))
+    finally:
+        os.close(fd)
+    return digest.hexdigest()
+
+
+class FingerprintCache:
+    """SQLite store of fingerprints keyed by (device, inode), valid while size and mtime are unchanged."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Used by one thread at a time, though not always the one that opened it (e.g. Organizer calls from a hook's workers)
+        self.conn = sqlite3.connect(str(self.db_path), timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def get(self, st, sample):
+        row = self.conn.execute(
+            "SELECT digest FROM fingerprints WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? AND sample = ?",
+            (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, sample),
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, st, sample, digest):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO fingerprints (device, inode, size, mtime_ns, sample, digest, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, sample, digest, time.time()),
+        )
+
+    def flush(self):
+        self.conn.commit()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class Deduper:
+    """
+    Replace planned video moves that duplicate a library file or an earlier file of the same plan.
+    library_dirs are walked once, on first use, to index existing videos by size.
+    """
+
+    def __init__(self, library_dirs, mode="skip", cache=None, workers=4, sample=SAMPLE_BYTES, video_ext=VIDEO_EXTS):
+        if mode not in DEDUPE_MODES:
+            raise ValueError(f"Invalid dedupe mode {mode!r} (expected one of {', '.join(DEDUPE_MODES)})")
+        self.library_dirs = [Path(d) for d in library_dirs]
+        self.mode = mode
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.sample = sample
+        self.video_ext = {ext.lower() for ext in video_ext}
+        self._library = None  # size -> [path]
+
+    def _library_sizes(self):
+        if self._library is None:
+            self._library = {}
+            stack = [d for d in self.library_dirs if d.is_dir()]
+            while stack:
+                directory = stack.pop()
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.name.rpartition(".")[2].lower() in self.video_ext and entry.is_file(follow_symlinks=False):
+                                self._library.setdefault(entry.stat().st_size, []).append(entry.path)
+                except OSError as e:
+                    logger.error("Failed to scan %s: %s", directory, e, extra={"indent": 2})
+        return self._library
+
+    def _fingerprints(self, paths):
+        """Fingerprint paths in parallel, using and filling the cache; returns {path: digest}."""
+        metrics = get_metrics()
+        result, todo = {}, []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            digest = self.cache.get(st, self.sample) if self.cache is not None else None
+            if digest is None:
+                todo.append((path, st))
+            else:
+                result[path] = digest
+        metrics.add("fingerprints_cached", len(result))
+        if todo:
+            with metrics.phase("fingerprint"), ThreadPoolExecutor(self.workers, thread_name_prefix="vorganize-hash") as pool:
+                futures = [(path, st, pool.submit(fingerprint, path, st.st_size, self.sample)) for path, st in todo]
+                for path, st, future in futures:
+                    try:
+                        digest = future.result()
+                    except OSError as e:
+                        logger.error("Failed to fingerprint %s: %s", path, e, extra={"indent": 2})
+                        continue
+                    result[path] = digest
+                    if self.cache is not None:
+                        self.cache.put(st, self.sample, digest)
+            metrics.add("fingerprints_computed", len(todo))
+            if self.cache is not None:
+                self.cache.flush()
+        return result
+
+    def apply(self, plan):
+        """Rewrite duplicate video moves of plan in place; returns the number of duplicates found."""
+        moves = []
+        for i, op in enumerate(plan.ops):
+            if op.action == "move" and op.kind == "video":
+                try:
+                    moves.append((i, op, os.stat(op.source).st_size))
+                except OSError:
+                    continue
+        library = self._library_sizes()
+        batch_sizes = {}
+        for _, _, size in moves:
+            batch_sizes[size] = batch_sizes.get(size, 0) + 1
+        candidates = [(i, op, size) for i, op, size in moves if batch_sizes[size] > 1 or size in library]
+        duplicates = self._replace_duplicates(plan, candidates, library) if candidates else 0
+        get_metrics().add("duplicates", duplicates)
+
+        # Moved files become part of the library for later plans (e.g. in --watch mode)
+        for i, op, size in moves:
+            if plan.ops[i].action == "move":
+                library.setdefault(size, []).append(os.fspath(op.dest))
+        return duplicates
+
+    def _replace_duplicates(self, plan, candidates, library):
+        paths = [op.source for _, op, _ in candidates]
+        paths += [path for size in {size for _, _, size in candidates} for path in library.get(size, ())]
+        digests = self._fingerprints(paths)
+
+        known = {}  # digest -> existing copy (library file, or destination of the first file in the batch)
+        for size in {size for _, _, size in candidates}:
+            for path in library.get(size, ()):
+                if path in digests:
+                    known.setdefault(digests[path], path)
+        duplicates = 0
+        for i, op, size in candidates:
+            digest = digests.get(op.source)
+            if digest is None:
+                continue
+            original = known.get(digest)
+            if original is None:
+                known[digest] = op.dest
+                continue
+            duplicates += 1
+            logger.info("Duplicate of %s: %s", original, op.name, extra={"indent": 2})
+            if self.mode == "hardlink":
+                plan.ops[i] = PlanOp("link", original, op.dest, op.kind, op.group, op.name, "duplicate")
+            else:
+                plan.ops[i] = PlanOp("skip", op.source, op.dest, op.kind, op.group, op.name, "duplicate")
+        return duplicates
@@ -0,0 +1,444 @@
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .metrics import get_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+"""_summary_:
+Parallel move scheduler.
+This module runs file moves on a bounded thread pool with a concurrency limit per device (st_dev), so
+cross-disk copies keep both disks busy without thrashing either one. Same-device moves are plain renames
+and run inline without going through the pool. Instead of moving, files can also be hardlinked, reflinked
+or symlinked into place so the source stays where it is (e.g. while it is still being seeded).
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class Throttle:
+    """
+    Token-bucket limit on bytes per second and/or files per second, shared by all move workers.
+    Each bucket holds one second of burst. Files are charged before they are placed; bytes are charged
+    per chunk as a copy goes (see chunk_size), so a large file is spread out instead of sent in one burst.
+    """
+
+    def __init__(self, mb_per_second=None, files_per_second=None):
+        self._buckets = {}
+        if mb_per_second:
+            self._buckets["bytes"] = [mb_per_second * 1024 * 1024, mb_per_second * 1024 * 1024]
+        if files_per_second:
+            self._buckets["files"] = [files_per_second, files_per_second]
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self._buckets)
+
+    @property
+    def limits_bytes(self):
+        return "bytes" in self._buckets
+
+    def chunk_size(self, default):
+        """Copy chunk to charge at a time: at most a quarter second of the byte rate."""
+        if "bytes" not in self._buckets:
+            return default
+        return max(64 * 1024, min(default, int(self._buckets["bytes"][0] / 4)))
+
+    def wait(self, nbytes=0, files=1):
+        """Block until nbytes and files may be transferred."""
+        costs = {"bytes": nbytes, "files": files}
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last
+            self._last = now
+            delay = 0.0
+            for name, bucket in self._buckets.items():
+                rate, tokens = bucket
+                tokens = min(rate, tokens + elapsed * rate) - costs[name]
+                bucket[1] = tokens
+                if tokens < 0:
+                    delay = max(delay, -tokens / rate)
+        if delay > 0:
+            time.sleep(delay)
+
+
+LINK_MODES = ("move", "hardlink", "reflink", "symlink", "auto")
+PLACED = {"hardlink": "hardlinked", "reflink": "reflinked", "symlink": "symlinked"}
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+
+
+def reflink(source, dest):
+    """Clone source into dest sharing its data blocks (FICLONE on btrfs/XFS); raises OSError when unsupported."""
+    if fcntl is None:
+        raise OSError(f"reflink is not supported on this platform: {source}")
+    with open(source, "rb") as src, open(dest, "xb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(dest)
+            raise
+    shutil.copystat(source, dest)
+
+
+COPY_CHUNK = 64 * 1024 * 1024
+VERIFY_SAMPLES = 8
+VERIFY_BLOCK = 1024 * 1024
+
+
+def _copy_range(src_fd, dst_fd, size, throttle=None):
+    """
+    Copy size bytes in kernel space (copy_file_range, then sendfile), falling back to read/write.
+    With a byte-limited throttle every chunk is charged as it is copied.
+    """
+    limited = throttle is not None and throttle.limits_bytes
+    chunk_size = throttle.chunk_size(COPY_CHUNK) if limited else COPY_CHUNK
+    offset = 0
+    for copy in ("copy_file_range", "sendfile"):
+        if not hasattr(os, copy):
+            continue
+        try:
+            while offset < size:
+                count = min(chunk_size, size - offset)
+                if copy == "copy_file_range":
+                    copied = os.copy_file_range(src_fd, dst_fd, count)
+                else:
+                    copied = os.sendfile(dst_fd, src_fd, offset, count)
+                if copied == 0:
+                    break
+                offset += copied
+                if limited:
+                    throttle.wait(copied, files=0)
+            if offset or not size:
+                return offset
+            # Some filesystems (FUSE, NFS, overlayfs, older kernels) report 0 bytes instead of an error
+            logger.debug("%s copied nothing, falling back", copy, extra={"indent": 4})
+        except OSError as e:
+            # EXDEV/ENOSYS/EINVAL etc.: the kernel can't do it for this pair of files, try the next method
+            if offset:
+                raise
+            logger.debug("%s unavailable (%s), falling back", copy, e, extra={"indent": 4})
+    os.lseek(src_fd, 0, os.SEEK_SET)
+    os.lseek(dst_fd, 0, os.SEEK_SET)
+    while offset < size:
+        chunk = os.read(src_fd, min(chunk_size, size - offset))
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            written = os.write(dst_fd, view)
+            view = view[written:]
+        offset += len(chunk)
+        if limited:
+            throttle.wait(len(chunk), files=0)
+    return offset
+
+
+_fallocate = None
+
+
+def _libc_fallocate():
+    """fallocate(2) from libc, or False where there is none (not Linux)."""
+    global _fallocate
+    if _fallocate is None:
+        _fallocate = False
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is not None:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            function = getattr(libc, "fallocate64", None) or getattr(libc, "fallocate", None)
+            if function is not None:
+                function.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+                function.restype = ctypes.c_int
+                _fallocate = function
+    return _fallocate
+
+
+def _preallocate(fd, size):
+    """
+    Reserve size bytes for a copy with fallocate(2). Filesystems without it (FAT/exFAT) are left alone:
+    posix_fallocate would emulate it there by writing zeros to every block, doubling the I/O.
+    """
+    fallocate = _libc_fallocate()
+    if fallocate and fallocate(fd, 0, 0, size) != 0:
+        err = ctypes.get_errno()
+        logger.debug("No preallocation (%s)", os.strerror(err), extra={"indent": 4})
+
+
+def _sample_digest(path, size):
+    """Hash VERIFY_SAMPLES evenly spaced blocks of the file (first and last block included)."""
+    digest = hashlib.blake2b()
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            # Read back from the disk, not from the page cache the copy just filled
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        last = max(size - VERIFY_BLOCK, 0)
+        offsets = sorted({last * i // (VERIFY_SAMPLES - 1) for i in range(VERIFY_SAMPLES)})
+        for offset in offsets:
+            digest.update(os.pread(fd, VERIFY_BLOCK, offset))
+    finally:
+        os.close(fd)
+    return digest.digest()
+
+
+def partial_path(dest):
+    """Temporary file a cross-device copy to dest is written to before it is renamed into place."""
+    dest = os.fspath(dest)
+    return os.path.join(os.path.dirname(dest), f".{os.path.basename(dest)}.vorganize-part")
+
+
+# link() failures meaning the filesystem (e.g. FAT/exFAT, some network shares) has no hardlinks
+NO_LINK_ERRNOS = {errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EMLINK, errno.ENOSYS}
+
+
+def _exists_error(dest):
+    return FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), os.fspath(dest))
+
+
+def rename_noreplace(source, dest):
+    """
+    Rename source to dest on the same filesystem without replacing a file that is already at dest
+    (FileExistsError): dest is created as a hardlink, which fails when it is taken, and source is
+    then unlinked. Filesystems without hardlinks fall back to a rename right after checking dest.
+    """
+    try:
+        os.link(source, dest, follow_symlinks=False)
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno not in NO_LINK_ERRNOS:
+            raise
+        if os.path.lexists(dest):
+            raise _exists_error(dest) from None
+        os.rename(source, dest)
+        return
+    os.unlink(source)
+
+
+def transfer_file(source, dest, verify=False, throttle=None):
+    """
+    Move a file to another filesystem: copy it in kernel space into a preallocated temporary file
+    next to dest (at the throttle's byte rate), optionally verify size and sampled block hashes, put it
+    in place without replacing anything already at dest (FileExistsError), and only then unlink the source.
+    """
+    source, dest = os.fspath(source), os.fspath(dest)
+    if os.path.lexists(dest):
+        raise _exists_error(dest)
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), dest)
+        os.unlink(source)
+        return
+    tmp = partial_path(dest)
+    try:
+        with open(source, "rb") as src, open(tmp, "wb") as dst:
+            size = os.fstat(src.fileno()).st_size
+            if size:
+                _preallocate(dst.fileno(), size)
+            copied = _copy_range(src.fileno(), dst.fileno(), size, throttle)
+            if copied != size:
+                raise OSError(f"short copy: {copied} of {size} bytes written to {dest}")
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copystat(source, tmp)
+        if verify:
+            if os.stat(tmp).st_size != size or _sample_digest(source, size) != _sample_digest(tmp, size):
+                raise OSError(f"verification failed for {dest}, source kept")
+        rename_noreplace(tmp, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    os.unlink(source)
+
+
+def _move(source, dest, same_device, verify, throttle=None):
+    if same_device:
+        try:
+            rename_noreplace(source, dest)
+            return
+        except OSError as e:
+            # Same st_dev but different mount points (bind mounts) still can't be renamed across
+            if e.errno != errno.EXDEV:
+                raise
+    transfer_file(source, dest, verify, throttle)
+
+
+def place_file(source, dest, link_mode="move", same_device=False, verify=False, throttle=None):
+    """Put source at dest using link_mode and return the mode that was used; copies go at the throttle's byte rate."""
+    if link_mode == "move":
+        _move(source, dest, same_device, verify, throttle)
+    elif link_mode == "hardlink":
+        os.link(source, dest)
+    elif link_mode == "reflink":
+        reflink(source, dest)
+    elif link_mode == "symlink":
+        os.symlink(os.path.abspath(source), dest)
+    elif link_mode == "auto":
+        # Cheapest safe mode first: links only work within one filesystem
+        if same_device:
+            for mode, link in (("hardlink", os.link), ("reflink", reflink)):
+                try:
+                    link(source, dest)
+                    return mode
+                except OSError as e:
+                    logger.debug("%s failed for %s (%s), trying next mode", mode, source, e, extra={"indent": 4})
+        _move(source, dest, same_device, verify, throttle)
+        return "move"
+    else:
+        raise ValueError(f"Invalid link mode {link_mode!r} (expected one of {', '.join(LINK_MODES)})")
+    return link_mode
+
+
+MoveJob = namedtuple("MoveJob", "source dest tag")
+# status is one of "moved", "skipped" (destination exists, also when it appeared after planning),
+# "missing" (source gone) or "error";
+# mode is how a moved file was put in place ("move", "hardlink", "reflink" or "symlink")
+MoveResult = namedtuple("MoveResult", "job status error mode", defaults=(None,))
+
+
+class MoveScheduler:
+    """Run MoveJobs concurrently, at most `per_device` transfers touching any one device at a time."""
+
+    def __init__(self, max_workers=4, per_device=1, throttle=None, link_mode="move", verify=False):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Invalid link mode {link_mode!r} (expected one of {', '.join(LINK_MODES)})")
+        self.link_mode = link_mode
+        self.verify = verify
+        self.max_workers = max(1, max_workers)
+        self.per_device = max(1, per_device)
+        self.throttle = throttle or None
+        self._device_locks = {}
+        self._dir_devices = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, device):
+        with self._lock:
+            semaphore = self._device_locks.get(device)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_device)
+                self._device_locks[device] = semaphore
+            return semaphore
+
+    def _dir_device(self, directory):
+        device = self._dir_devices.get(directory)
+        if device is None:
+            get_metrics().add("stat_calls")
+            device = os.stat(directory).st_dev
+            self._dir_devices[directory] = device
+        return device
+
+    def transfer(self, source, dest, same_device=False):
+        """Move or link one file; runs on a worker thread for cross-device moves."""
+        return place_file(source, dest, self.link_mode, same_device, self.verify, self.throttle)
+
+    def _execute(self, job, devices=(), same_device=False):
+        semaphores = [self._semaphore(device) for device in sorted(set(devices))]
+        for semaphore in semaphores:
+            semaphore.acquire()
+        try:
+            if self.throttle is not None:
+                # Files are charged here; the bytes of a copy are charged chunk by chunk as it runs
+                self.throttle.wait(0, files=1)
+            mode = self.transfer(job.source, job.dest, same_device=same_device)
+            metrics = get_metrics()
+            if metrics:
+                metrics.add("bytes_moved", os.lstat(job.dest).st_size)
+                metrics.add(f"files_{PLACED[mode] if mode != 'move' else 'renamed' if same_device else 'copied'}")
+            return MoveResult(job, "moved", None, mode)
+        except FileExistsError:
+            # Taken since the plan was made (another run, or a file that just arrived): never overwrite it
+            return MoveResult(job, "skipped", None)
+        except FileNotFoundError as e:
+            if not os.path.lexists(job.source):
+                return MoveResult(job, "missing", None)
+            return MoveResult(job, "error", e)
+        except (OSError, shutil.Error) as e:
+            return MoveResult(job, "error", e)
+        finally:
+            for semaphore in reversed(semaphores):
+                semaphore.release()
+
+    def _precheck(self, job):
+        """Return a MoveResult for jobs that need no transfer, else (source device, dest device)."""
+        try:
+            get_metrics().add("stat_calls", 2)
+            if os.path.lexists(job.dest):
+                return MoveResult(job, "skipped", None)
+            st = os.stat(job.source)
+            dest_device = self._dir_device(os.path.dirname(os.fspath(job.dest)))
+        except FileNotFoundError:
+            return MoveResult(job, "missing", None)
+        except OSError as e:
+            return MoveResult(job, "error", e)
+        return st.st_dev, dest_device
+
+    def _devices(self, job):
+        """Devices of a job checked in advance (e.g. by a MovePlan), from one stat per directory."""
+        try:
+            source_device = self._dir_device(os.path.dirname(os.fspath(job.source)))
+            dest_device = self._dir_device(os.path.dirname(os.fspath(job.dest)))
+        except FileNotFoundError:
+            return MoveResult(job, "missing", None)
+        except OSError as e:
+            return MoveResult(job, "error", e)
+        return source_device, dest_device
+
+    def run_one(self, job, checked=False):
+        """Execute one job on the calling thread and return its MoveResult."""
+        devices = self._devices(job) if checked else self._precheck(job)
+        if isinstance(devices, MoveResult):
+            return devices
+        source_device, dest_device = devices
+        if source_device == dest_device:
+            return self._execute(job, same_device=True)
+        return self._execute(job, (source_device, dest_device))
+
+    def run(self, jobs, checked=False):
+        """
+        Execute jobs and yield a MoveResult for each one as it completes.
+        With checked=True the jobs' destinations were found free when they were planned and no per-file
+        stat is made; a destination taken since then is still reported as skipped, never overwritten.
+        """
+        check = self._devices if checked else self._precheck
+        pending = set()
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix="vorganize-move") as pool:
+            try:
+                for job in jobs:
+                    devices = check(job)
+                    if isinstance(devices, MoveResult):
+                        yield devices
+                        continue
+                    source_device, dest_device = devices
+                    same_device = source_device == dest_device
+                    if same_device or self.link_mode in ("hardlink", "reflink", "symlink"):
+                        # Renames and links move no data, no point in handing them to the pool
+                        yield self._execute(job, same_device=same_device)
+                    else:
+                        pending.add(
+                            pool.submit(self._execute, job, (source_device, dest_device))
+                        )
+
+                    for future in [f for f in pending if f.done()]:
+                        pending.discard(future)
+                        yield future.result()
+
+                for future in as_completed(list(pending)):
+                    pending.discard(future)
+                    yield future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
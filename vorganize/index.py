@@ -0,0 +1,291 @@
+from collections import namedtuple
+from pathlib import Path
+import json
+import logging
+import os
+import sqlite3
+import time
+from .core import Classifier, subtitle_list
+from .metrics import get_metrics
+from .probe import ProbeInfo
+from .storage import FILE_TYPES
+"""_summary_:
+SQLite-backed library index.
+This module provides an alternative to the JSON catalog that also remembers every source file it has seen,
+keyed by path, size and mtime, together with its classification, destination and move status. Unchanged files
+can be skipped on the next run and an interrupted run resumes from the recorded state.
+Every episode moved into the library is also recorded by show folder, season and episode number, so the library
+can be queried (listings, missing episodes, recent additions, sizes) without walking it.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for another run holding the write lock before failing
+BUSY_TIMEOUT = 300
+
+IndexRecord = namedtuple(
+    "IndexRecord",
+    "source size mtime_ns kind title season filename subtitle destination status",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    title TEXT,
+    season INTEGER,
+    filename TEXT NOT NULL,
+    subtitle TEXT,
+    destination TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS probes (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    title TEXT,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    path TEXT PRIMARY KEY,
+    source TEXT,
+    show TEXT NOT NULL,
+    season INTEGER NOT NULL,
+    episode INTEGER,
+    size INTEGER NOT NULL,
+    added REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS episodes_show ON episodes (show, season, episode);
+CREATE INDEX IF NOT EXISTS episodes_added ON episodes (added);
+CREATE INDEX IF NOT EXISTS episodes_source ON episodes (source);
+CREATE TABLE IF NOT EXISTS catalog (
+    list TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (list, name)
+);
+"""
+
+
+def _key(source):
+    return os.path.abspath(os.fspath(source))
+
+
+def _stat(source):
+    # Scanner DirEntry objects cache their stat result
+    get_metrics().add("stat_calls")
+    return source.stat() if isinstance(source, os.DirEntry) else os.stat(source)
+
+
+def _placed(destination, source_st):
+    """Whether a file moved to destination is still there while its source (source_st) exists."""
+    if not destination:
+        return False
+    get_metrics().add("stat_calls")
+    try:
+        st = os.stat(destination)
+    except OSError:
+        return False
+    return (st.st_dev, st.st_ino) == (source_st.st_dev, source_st.st_ino)
+
+
+class LibraryIndex:
+    """
+    SQLite catalog backend with the same store()/flush()/close() interface as JsonCatalog.
+    Writes are grouped in transactions of `flush_every` changes.
+    classifier reads episode numbers from the names of moved episodes (default: the built-in rules).
+    """
+
+    def __init__(self, db_path, flush_every=500, classifier=None):
+        self.db_path = Path(db_path)
+        self.classifier = classifier
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not self.db_path.exists()
+        self.flush_every = flush_every
+        self._pending = 0
+        # Used by one thread at a time, though not always the one that opened it (e.g. Organizer calls from a hook's workers)
+        self.conn = sqlite3.connect(str(self.db_path), timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def _changed(self):
+        self._pending += 1
+        if self.flush_every and self._pending >= self.flush_every:
+            self.flush()
+
+    def store(self, video_type, data, json_file=None, source=None, subtitle=None):
+        """Record video metadata; same arguments as store_as_json plus the source path."""
+        file_type = FILE_TYPES[video_type]
+        if video_type == "s":
+            title, season, filename = data
+            list_entry = title
+        else:
+            title, season, filename = None, None, data
+            list_entry = data
+        self.conn.execute(
+            "INSERT OR IGNORE INTO catalog (list, name) VALUES (?, ?)", (file_type, list_entry)
+        )
+        subtitles = subtitle_list(subtitle)
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO catalog (list, name) VALUES (?, ?)",
+            [(f"{file_type}_subtitles", sub.rsplit("/", 1)[-1]) for sub in subtitles],
+        )
+
+        if source is not None:
+            st = _stat(source)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (source, size, mtime_ns, kind, title, season, filename, subtitle, destination, status, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, 'pending', ?)",
+                (
+                    _key(source),
+                    st.st_size,
+                    st.st_mtime_ns,
+                    video_type,
+                    title,
+                    season,
+                    filename,
+                    "\n".join(subtitles) or None,
+                    time.time(),
+                ),
+            )
+        self._changed()
+
+    def lookup(self, source, st=None):
+        """
+        Return the IndexRecord for source if it is indexed and unchanged, else None.
+        A moved record only counts while its move stuck: the destination exists and the source is gone or is
+        the destination itself (a hardlink or symlink of the link modes). A source back in place (undo, manual
+        restore, failed delete) is classified again.
+        """
+        row = self.conn.execute(
+            "SELECT source, size, mtime_ns, kind, title, season, filename, subtitle, destination, status "
+            "FROM files WHERE source = ?",
+            (_key(source),),
+        ).fetchone()
+        if row is None:
+            return None
+        if st is None:
+            try:
+                st = _stat(source)
+            except OSError:
+                return None
+        record = IndexRecord(*row)
+        if record.subtitle:
+            record = record._replace(subtitle=tuple(record.subtitle.split("\n")))
+        if record.size != st.st_size or record.mtime_ns != st.st_mtime_ns:
+            return None
+        if record.status == "moved" and not _placed(record.destination, st):
+            return None
+        return record
+
+    def mark_moved(self, source, destination):
+        """Record that source was moved to destination, and the episode it is when it is one."""
+        now = time.time()
+        self.conn.execute(
+            "UPDATE files SET destination = ?, status = 'moved', updated = ? WHERE source = ?",
+            (str(destination), now, _key(source)),
+        )
+        row = self.conn.execute(
+            "SELECT size, season FROM files WHERE source = ? AND kind = 's'", (_key(source),)
+        ).fetchone()
+        if row is not None:
+            size, season = row
+            destination = Path(destination)
+            # Episodes are filed as shows/<show>/Season N/<name>
+            self.store_episode(destination, destination.parent.parent.name, season, self.episode_number(destination.name), size, now, source)
+        self._changed()
+
+    def forget(self, source):
+        """Drop the record of source, e.g. after its move was undone, so the next run processes it again."""
+        self.conn.execute("DELETE FROM files WHERE source = ?", (_key(source),))
+        self.conn.execute("DELETE FROM episodes WHERE source = ?", (_key(source),))
+        self._changed()
+
+    def episode_number(self, name):
+        """Episode number in a filename, or None."""
+        if self.classifier is None:
+            self.classifier = Classifier()
+        return self.classifier.classify(name).episode
+
+    def store_episode(self, path, show, season, episode, size, added, source=None):
+        """Record an episode file of the library under its show folder name."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO episodes (path, source, show, season, episode, size, added) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (_key(path), _key(source) if source is not None else None, show, season, episode, size, added),
+        )
+
+    def clear_episodes(self):
+        self.conn.execute("DELETE FROM episodes")
+
+    def lookup_probe(self, source, st):
+        """Return the cached ProbeInfo for source if the file is unchanged, else None."""
+        row = self.conn.execute(
+            "SELECT duration, width, height, title FROM probes WHERE source = ? AND size = ? AND mtime_ns = ?",
+            (_key(source), st.st_size, st.st_mtime_ns),
+        ).fetchone()
+        return ProbeInfo(*row) if row is not None else None
+
+    def store_probe(self, source, st, info):
+        """Cache the ProbeInfo of source for its current size and mtime."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO probes (source, size, mtime_ns, duration, width, height, title, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (_key(source), st.st_size, st.st_mtime_ns, *info, time.time()),
+        )
+        self._changed()
+
+    def entries(self, file_type):
+        """Return the sorted catalog list for shows, movies or videos (or their _subtitles)."""
+        return [
+            name
+            for (name,) in self.conn.execute(
+                "SELECT name FROM catalog WHERE list = ? ORDER BY name", (file_type,)
+            )
+        ]
+
+    def import_json(self, script_dir):
+        """Import shows.json, movies.json and other_videos.json from script_dir."""
+        imported = 0
+        for json_name in ("shows.json", "movies.json", "other_videos.json"):
+            json_path = Path(script_dir) / json_name
+            if not json_path.exists():
+                continue
+            try:
+                with open(json_path, "r") as f:
+                    json_data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error("Failed to import %s: %s", json_path, e, extra={"indent": 2})
+                continue
+            for list_name, names in json_data.items():
+                if isinstance(names, dict):
+                    names = list(names.keys())
+                rows = [(list_name, name) for name in names if isinstance(name, str)]
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO catalog (list, name) VALUES (?, ?)", rows
+                )
+                imported += len(rows)
+        self.conn.commit()
+        logger.info("Imported %s catalog entries from %s", imported, script_dir, extra={"indent": 0})
+        return imported
+
+    def flush(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -1,34 +1,126 @@
 from pathlib import Path
-import os, sys
+import os
 import logging
-from colorama import Fore, Style
-from collections import defaultdict
-from .core import extract_series_title, find_subtitle
+import queue
+import threading
+from collections import defaultdict, namedtuple
+from .core import default_classifier, subtitle_list
 from .storage import store_as_json
-from .organize import move_series, move_items
-from .core import find_subtitle
-from tqdm import tqdm
+from .organize import plan_series, plan_items, _record_skip, _record_result, _log_counts
+from .executor import MoveJob, MoveScheduler
+from .plan import MovePlan
+from .console import colors, progress_bar
 
 """_summary_:
 Interactive video file organizer.
 This module provides functionality to interactively rename and categorize video files into Movies, TV Shows, and Other Videos.
-It allows users to rename files, categorize them, and move them to appropriate directories. 
+It allows users to rename files, categorize them, and move them to appropriate directories.
+Each file is handed to a background mover as soon as it is categorized, so copies run while the user types.
 """
 
 
 logger = logging.getLogger(__name__)
 
-def handle_inter(source, videos, dest_dict, series_pattern, common_subtitle_exts):
-    """Handle interactive renaming and categorization of videos with a progress bar."""
+# series/movies/other_videos are what the user categorized; counts is {group: [videos, subtitles, skipped, errors]}
+InteractiveResult = namedtuple("InteractiveResult", "series movies other_videos counts interrupted")
+
+
+class _BackgroundMover:
+    """
+    Runs planned moves on one worker thread while the prompt loop goes on.
+    Results are collected on the caller's thread (drain), which also owns the catalog.
+    """
+
+    def __init__(self, scheduler=None, journal=None):
+        self.scheduler = scheduler or MoveScheduler()
+        self.journal = journal
+        self.plan = MovePlan()
+        self.counts = {}
+        self.queued = 0
+        self.moved = 0
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=self._work, name="vorganize-interactive-mover", daemon=True)
+        self._thread.start()
+
+    def _work(self):
+        while True:
+            op = self._jobs.get()
+            if op is None:
+                return
+            if op.action == "mkdir":
+                try:
+                    if self.journal is not None:
+                        self.journal.mkdir(op.dest)
+                    else:
+                        os.makedirs(op.dest, exist_ok=True)
+                except OSError as e:
+                    logger.error("Failed to create %s: %s", op.dest, e, extra={"indent": 2})
+                continue
+            self._results.put(self.scheduler.run_one(MoveJob(op.source, op.dest, op), checked=True))
+
+    def submit(self, first_op):
+        """Queue the operations added to the plan since index first_op."""
+        if self.journal is not None:
+            self.journal.intend([op for op in self.plan.ops[first_op:] if op.action == "move"])
+        for op in self.plan.ops[first_op:]:
+            if op.action == "skip":
+                _record_skip(op, self.counts)
+                continue
+            if op.action == "move":
+                self.queued += 1
+            self._jobs.put(op)
+
+    def drain(self, catalog=None):
+        """Count the moves finished so far."""
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                return
+            _record_result(result, self.counts, catalog, self.journal)
+            self.moved += 1
+
+    def close(self, catalog=None):
+        """Wait for the queued moves; on Ctrl+C only the move in progress is finished."""
+        self._jobs.put(None)
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            logger.warning("Keyboard interrupt detected. Finishing the current move and cancelling the rest.", extra={"indent": 0})
+            while True:
+                try:
+                    self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+            self._jobs.put(None)
+            self._thread.join()
+        self.drain(catalog)
+
+def handle_inter(source, videos, dest_dict, series_pattern=None, common_subtitle_exts=None, catalog=None, classifier=None, scheduler=None, show_index=None, journal=None):
+    """
+    Handle interactive renaming and categorization of videos with a progress bar.
+    Categorized files are moved in the background right away; returns an InteractiveResult.
+    Episodes go to existing show folders through show_index when one is given, and moves are journaled to journal.
+    """
+    source = Path(source)
     user_series_dict = defaultdict(lambda: defaultdict(list))
     user_movie_list = []
     user_vid_list = []
-    
+    classifier = classifier or default_classifier()
+    mover = _BackgroundMover(scheduler, journal)
+    interrupted = False
+
     logger.info("Starting interactive mode", extra={"indent": 0})
+    # Prompts are colored on a terminal only, like the log lines
+    Fore, Style = colors()
+    progress = progress_bar(videos, desc="Categorized")
     try:
-        # Wrap the loop with tqdm for progress bar
-        for video_file, subtitle_file in tqdm(videos, desc="Interactive processing", unit="file",bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}]"):
-            logger.info(f"Processing {video_file}", extra={"indent": 2})
+        # Wrap the loop with a progress bar
+        for video_file, subtitle_file in progress:
+            mover.drain(catalog)
+            progress.set_postfix_str(f"moved {mover.moved}/{mover.queued}")
+            logger.info("Processing %s", video_file, extra={"indent": 2})
             original_video_file = video_file
             
             # Prompt for renaming video file
@@ -36,30 +128,39 @@ def handle_inter(source, videos, dest_dict, series_pattern, common_subtitle_exts
                 new_name = input(f"{Fore.CYAN}Enter new name for '{video_file}' without extension (press Enter to keep): {Style.RESET_ALL}")
             except KeyboardInterrupt:
                 logger.warning("Keyboard interrupt detected during renaming. Saving progress and exiting.", extra={"indent": 2})
+                interrupted = True
                 break
 
             if new_name:
                 new_ext = f'.{video_file.split(".")[-1]}'
-                new_video_file = new_name + new_ext
+                video_dir = video_file.rpartition("/")[0]
+                new_video_file = f"{video_dir}/{new_name}{new_ext}" if video_dir else new_name + new_ext
                 try:
                     os.rename(source / video_file, source / new_video_file)
-                    logger.info(f"Renamed video: {video_file} -> {new_video_file}", extra={"indent": 4})
+                    logger.info("Renamed video: %s -> %s", video_file, new_video_file, extra={"indent": 4})
                     video_file = new_video_file
                 except OSError as e:
-                    logger.error(f"Failed to rename video {video_file}: {e}", extra={"indent": 4})
+                    logger.error("Failed to rename video %s: %s", video_file, e, extra={"indent": 4})
                     continue
 
-            # Rename subtitle file if it exists and video was renamed
+            # Rename subtitle files if they exist and video was renamed, keeping language suffixes
             if subtitle_file and new_name:
-                new_sub_ext = f'.{subtitle_file.split(".")[-1]}'
-                new_subtitle_file = new_name + new_sub_ext
-                try:
-                    os.rename(source / subtitle_file, source / new_subtitle_file)
-                    logger.info(f"Renamed subtitle: {subtitle_file} -> {new_subtitle_file}", extra={"indent": 4})
-                    subtitle_file = new_subtitle_file
-                except OSError as e:
-                    logger.error(f"Failed to rename subtitle {subtitle_file}: {e}", extra={"indent": 4})
-                    subtitle_file = None
+                original_stem = original_video_file.rpartition("/")[2].rpartition(".")[0]
+                renamed_subtitles = []
+                for sub in subtitle_list(subtitle_file):
+                    sub_dir, _, sub_name = sub.rpartition("/")
+                    if sub_name.casefold().startswith(original_stem.casefold()):
+                        new_sub_ext = sub_name[len(original_stem):]
+                    else:
+                        new_sub_ext = f'.{sub_name.split(".")[-1]}'
+                    new_subtitle_file = f"{sub_dir}/{new_name}{new_sub_ext}" if sub_dir else new_name + new_sub_ext
+                    try:
+                        os.rename(source / sub, source / new_subtitle_file)
+                        logger.info("Renamed subtitle: %s -> %s", sub, new_subtitle_file, extra={"indent": 4})
+                        renamed_subtitles.append(new_subtitle_file)
+                    except OSError as e:
+                        logger.error("Failed to rename subtitle %s: %s", sub, e, extra={"indent": 4})
+                subtitle_file = tuple(renamed_subtitles) or None
 
             # Prompt for categorization
             try:
@@ -67,44 +168,56 @@ def handle_inter(source, videos, dest_dict, series_pattern, common_subtitle_exts
                     category = input(f"{Fore.CYAN}Categorize '{video_file}' (m=movies, s=tv-shows, o=other): {Style.RESET_ALL}").lower()
                     if category in dest_dict:
                         break
-                    logger.error(f"Invalid category '{category}'. Please enter m, s, or o.", extra={"indent": 4})
+                    logger.error("Invalid category '%s'. Please enter m, s, or o.", category, extra={"indent": 4})
             except KeyboardInterrupt:
                 logger.warning("Keyboard interrupt detected during categorization. Saving progress and exiting.", extra={"indent": 2})
+                interrupted = True
                 break
 
-            # Store in appropriate data structure
+            # Store in appropriate data structure and start moving the file
+            video_name = video_file.rpartition("/")[2]
+            # Recorded with its (renamed) source, so the index marks it moved and lists the episode
+            video_path = source / video_file
+            first_op = len(mover.plan.ops)
             if category == "s":
-                series_title, season_number = extract_series_title(video_file, series_pattern)
-                if series_title:
-                    series_title = series_title.replace('.', ' ')
+                info = classifier.classify(video_name)
+                if info.kind == "s":
+                    series_title, season_number = info.title, info.season
                     user_series_dict[series_title][season_number].append((video_file, subtitle_file))
-                    store_as_json("s", (series_title, season_number, video_file), dest_dict["s"].parent / "shows.json")
+                    store_as_json("s", (series_title, season_number, video_name), dest_dict["s"].parent / "shows.json", catalog, source=video_path, subtitle=subtitle_file)
+                    plan_series({series_title: {season_number: [(video_file, subtitle_file)]}}, source, dest_dict["s"], mover.plan, show_index)
                 else:
-                    logger.warning(f"Could not extract series title from {video_file}. Skipping.", extra={"indent": 4})
+                    logger.warning("Could not extract series title from %s. Skipping.", video_file, extra={"indent": 4})
             elif category == "m":
                 user_movie_list.append((video_file, subtitle_file))
-                store_as_json("m", video_file, dest_dict["m"].parent / "movies.json")
+                store_as_json("m", video_name, dest_dict["m"].parent / "movies.json", catalog, source=video_path, subtitle=subtitle_file)
+                plan_items([(video_file, subtitle_file)], source, dest_dict["m"], "movies", mover.plan)
             else:
                 user_vid_list.append((video_file, subtitle_file))
-                store_as_json("o", video_file, dest_dict["o"].parent / "other_videos.json")
+                store_as_json("o", video_name, dest_dict["o"].parent / "other_videos.json", catalog, source=video_path, subtitle=subtitle_file)
+                plan_items([(video_file, subtitle_file)], source, dest_dict["o"], "videos", mover.plan)
+            mover.submit(first_op)
 
     except KeyboardInterrupt:
         logger.warning("Keyboard interrupt detected. Saving progress and exiting.", extra={"indent": 0})
+        interrupted = True
+    finally:
+        progress.close()
 
-    # Move files processed so far
-    if user_series_dict or user_movie_list or user_vid_list:
-        logger.info("Moving files processed before interrupt", extra={"indent": 0})
-        move_series(user_series_dict, source, dest_dict["s"])
-        move_items(user_movie_list, source, dest_dict["m"], item_type="movies")
-        move_items(user_vid_list, source, dest_dict["o"], item_type="videos")
+    # Wait for the moves still running in the background
+    mover.drain(catalog)
+    if mover.moved < mover.queued:
+        logger.info("Waiting for %s moves to finish", mover.queued - mover.moved, extra={"indent": 0})
+    mover.close(catalog)
+    _log_counts(mover.counts)
 
     # Log summary
     total_series = len(user_series_dict)
     total_episodes = sum(len(episodes) for series in user_series_dict.values() for episodes in series.values())
     total_movies = len(user_movie_list)
     total_others = len(user_vid_list)
-    logger.info(f"Interactive mode interrupted: Processed {total_series} series ({total_episodes} episodes), {total_movies} movies, {total_others} other videos", extra={"indent": 0})
-    
-    if total_series or total_movies or total_others:
+    logger.info("Interactive mode %s: Processed %s series (%s episodes), %s movies, %s other videos", "interrupted" if interrupted else "finished", total_series, total_episodes, total_movies, total_others, extra={"indent": 0})
+
+    if interrupted and (total_series or total_movies or total_others):
         logger.info("Progress saved. Run the script again to continue processing.", extra={"indent": 0})
-    sys.exit(0)
\ No newline at end of file
+    return InteractiveResult(user_series_dict, user_movie_list, user_vid_list, mover.counts, interrupted)
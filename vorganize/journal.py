@@ -0,0 +1,448 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from .executor import _sample_digest, partial_path, place_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: a live run cannot be told from a dead one
+    fcntl = None
+"""_summary_:
+Crash-safe move journal.
+This module keeps an append-only, write-ahead journal of each run in script_dir/journal/<run-id>.journal, one
+JSON record per line: the folders a run created, every planned move or link (written and fsynced before the
+move starts) and its outcome. Outcomes are fsynced in batches: one lost in a crash is re-derived from the two
+paths of its move, so recovery only looks at the files the journal names and never walks the library.
+recover_runs() finishes or rolls back the operations of runs that died (OOM, reboot, SIGKILL), and
+undo_run() puts every file of a run back where it came from and removes the folders the run created.
+A run holds an exclusive lock on its journal while it is open, so a live run (a --watch daemon, a cron run
+still copying) is never taken for a dead one.
+"""
+
+logger = logging.getLogger(__name__)
+
+FSYNC_EVERY = 64
+FSYNC_INTERVAL = 1.0
+SUFFIX = ".journal"
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # e.g. Windows, where directories cannot be opened
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _same_device(a, b):
+    try:
+        return os.stat(os.path.dirname(a)).st_dev == os.stat(os.path.dirname(b)).st_dev
+    except OSError:
+        return False
+
+
+def resolve(intent, link_mode="move"):
+    """
+    Find out from the file system how a move or link without a recorded outcome ended, finishing
+    an interrupted cross-device move whose copy is complete and removing a partial copy.
+    Returns ("done", mode) or ("failed", "rolled_back" / "lost" / "conflict").
+    """
+    source, dest = intent["source"], intent["dest"]
+    source_exists, dest_exists = os.path.lexists(source), os.path.lexists(dest)
+    if intent["action"] == "link":
+        return ("done", "link") if dest_exists else ("failed", "rolled_back")
+    # A copy that was not finished, or already linked into place but not yet removed
+    try:
+        os.unlink(partial_path(dest))
+    except FileNotFoundError:
+        pass
+    if not dest_exists:
+        return ("failed", "rolled_back") if source_exists else ("failed", "lost")
+    if not source_exists:
+        return "done", "move"
+    if os.path.islink(dest) and not os.path.islink(source):
+        return "done", "symlink"
+    if os.path.samefile(source, dest):
+        if link_mode == "move":
+            # A rename is done as link + unlink so it never replaces a file; only the unlink was missing
+            os.unlink(source)
+            return "done", "move"
+        return "done", "hardlink"
+    same_device = _same_device(source, dest)
+    if link_mode in ("reflink", "auto") and same_device:
+        return "done", "reflink"
+    if link_mode in ("move", "auto"):
+        # The copy was renamed into place but the source not yet unlinked
+        size = os.path.getsize(source)
+        if os.path.getsize(dest) == size and _sample_digest(source, size) == _sample_digest(dest, size):
+            os.unlink(source)
+            return "done", "move"
+    return "failed", "conflict"
+
+
+class Journal:
+    """
+    Write-ahead journal of one run. The file is only created by the first record, so runs that
+    touch nothing leave no journal behind. Methods may be called from several threads.
+    index_db is the SQLite index the run records its moves in, so undo_run() can forget them there.
+    """
+
+    def __init__(self, directory, run_id=None, link_mode="move", fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL, index_db=None):
+        self.directory = Path(directory)
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.path = self.directory / f"{self.run_id}{SUFFIX}"
+        self.link_mode = link_mode
+        self.index_db = os.path.abspath(index_db) if index_db else None
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._seq = 0
+        self._open = {}  # seq -> intent without an outcome
+        self._seqs = {}  # (source, dest) -> seq
+        self._unsynced = 0
+        self._synced = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _write(self, record, sync=False):
+        if self._file is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            if fcntl is not None:
+                # Held until close(): recovery leaves journals of live runs alone
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            begin = {"type": "begin", "run": self.run_id, "time": time.time(), "link_mode": self.link_mode}
+            if self.index_db:
+                begin["index"] = self.index_db
+            self._file.write(json.dumps(begin, ensure_ascii=False) + "\n")
+            sync = True
+            _fsync_dir(self.directory)
+            logger.info("Journal: run %s", self.run_id, extra={"indent": 0})
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._unsynced += 1
+        if sync or self._unsynced >= self.fsync_every or time.monotonic() - self._synced >= self.fsync_interval:
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced = time.monotonic()
+
+    def mkdir(self, directory):
+        """Create directory (and missing parents) and record the folders that did not exist yet."""
+        created = []
+        parent = os.path.abspath(directory)
+        while not os.path.isdir(parent):
+            created.append(parent)
+            parent = os.path.dirname(parent)
+        os.makedirs(directory, exist_ok=True)
+        if created:
+            with self._lock:
+                self._write({"type": "mkdir", "dirs": created[::-1]})
+
+    def intend(self, ops):
+        """Record the moves and links about to run (PlanOps) and make them durable before they start."""
+        with self._lock:
+            for op in ops:
+                self._seq += 1
+                intent = {
+                    "type": "intent",
+                    "seq": self._seq,
+                    "action": op.action,
+                    "source": os.fspath(op.source),
+                    "dest": os.fspath(op.dest),
+                    "kind": op.kind,
+                }
+                self._open[self._seq] = intent
+                self._seqs[(intent["source"], intent["dest"])] = self._seq
+                self._write(intent)
+            if self._file is not None:
+                self._sync()
+
+    def record(self, op, status, mode=None):
+        """Record the outcome of a journaled PlanOp: status "moved" (with the mode used), or why it was not."""
+        with self._lock:
+            seq = self._seqs.pop((os.fspath(op.source), os.fspath(op.dest)), None)
+            if seq is None:
+                return
+            del self._open[seq]
+            if status == "moved":
+                self._write({"type": "done", "seq": seq, "mode": mode or "move"})
+            else:
+                self._write({"type": "failed", "seq": seq, "status": status})
+
+    def mark(self, kind, **fields):
+        """Write a marker record (e.g. where each batch of a long-lived Organizer starts); readers skip it."""
+        with self._lock:
+            self._write({"type": kind, "time": time.time(), **fields})
+
+    def close(self):
+        """Settle operations whose outcome was never recorded (e.g. after Ctrl+C) and mark the run finished."""
+        with self._lock:
+            if self._file is None:
+                return
+            for seq, intent in sorted(self._open.items()):
+                try:
+                    outcome, detail = resolve(intent, self.link_mode)
+                except OSError as e:
+                    logger.error("Failed to settle %s: %s", intent["source"], e, extra={"indent": 2})
+                    outcome, detail = "failed", "error"
+                self._write({"type": outcome, "seq": seq, "mode" if outcome == "done" else "status": detail})
+            self._open.clear()
+            self._seqs.clear()
+            self._write({"type": "end", "time": time.time()}, sync=True)
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def _read(path):
+    """Parse a journal file, ignoring a line torn by a crash."""
+    state = {"begin": {}, "intents": {}, "outcomes": {}, "dirs": [], "undone": set(), "end": False}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            kind = record.get("type")
+            if kind == "begin":
+                state["begin"] = record
+            elif kind == "intent":
+                state["intents"][record["seq"]] = record
+            elif kind in ("done", "failed"):
+                state["outcomes"][record["seq"]] = record
+            elif kind == "mkdir":
+                state["dirs"].extend(record["dirs"])
+            elif kind == "undone":
+                state["undone"].add(record["seq"])
+            elif kind == "end":
+                state["end"] = True
+    return state
+
+
+def _last_record(path):
+    """The last complete record of a journal, reading only its tail."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4096))
+        lines = f.read().splitlines()
+    for line in reversed(lines):
+        try:
+            return json.loads(line)
+        except ValueError:
+            continue
+    return None
+
+
+def list_runs(directory):
+    """Run ids with a journal in directory, oldest first."""
+    try:
+        return sorted(name[:-len(SUFFIX)] for name in os.listdir(directory) if name.endswith(SUFFIX))
+    except FileNotFoundError:
+        return []
+
+
+@contextmanager
+def _claimed(path):
+    """
+    Lock a journal for recovery or undo; yields False while its run is still alive
+    (or another process is recovering it), True otherwise.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _is_live(path):
+    with _claimed(path) as claimed:
+        return not claimed
+
+
+def unfinished_runs(directory):
+    """Run ids whose journal was never closed and whose process is gone (crash, reboot, kill -9)."""
+    unfinished = []
+    for run_id in list_runs(directory):
+        path = Path(directory) / f"{run_id}{SUFFIX}"
+        last = _last_record(path)
+        if (last is None or last.get("type") not in ("end", "undo")) and not _is_live(path):
+            unfinished.append(run_id)
+    return unfinished
+
+
+def prune_runs(directory, keep_days=30):
+    """Delete the journals of finished runs last written more than keep_days ago; returns how many."""
+    cutoff = time.time() - keep_days * 86400
+    pruned = 0
+    for run_id in list_runs(directory):
+        path = Path(directory) / f"{run_id}{SUFFIX}"
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+            last = _last_record(path)
+        except OSError:
+            continue
+        if last is not None and last.get("type") in ("end", "undo") and not _is_live(path):
+            path.unlink()
+            pruned += 1
+    if pruned:
+        logger.debug("Pruned %s old journals from %s", pruned, directory, extra={"indent": 0})
+    return pruned
+
+
+def _append(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def recover_runs(directory):
+    """Finish or roll back the open operations of every unfinished run; returns {outcome: count}."""
+    totals = {}
+    for run_id in unfinished_runs(directory):
+        path = Path(directory) / f"{run_id}{SUFFIX}"
+        with _claimed(path) as claimed:
+            if claimed:
+                _recover(path, run_id, totals)
+    return totals
+
+
+def _recover(path, run_id, totals):
+    """Settle the open operations of one dead run, adding to totals, and mark the run finished."""
+    state = _read(path)
+    if state["end"]:
+        return  # Recovered by another process in the meantime
+    link_mode = state["begin"].get("link_mode", "move")
+    records = []
+    for seq, intent in sorted(state["intents"].items()):
+        if seq in state["outcomes"]:
+            continue
+        try:
+            outcome, detail = resolve(intent, link_mode)
+        except OSError as e:
+            logger.error("Failed to recover %s: %s", intent["source"], e, extra={"indent": 2})
+            outcome, detail = "failed", "error"
+        records.append({"type": outcome, "seq": seq, "mode" if outcome == "done" else "status": detail, "recovered": True})
+        key = "finished" if outcome == "done" else detail
+        totals[key] = totals.get(key, 0) + 1
+        if detail in ("lost", "conflict"):
+            logger.warning("Could not recover %s -> %s (%s)", intent["source"], intent["dest"], detail, extra={"indent": 2})
+    records.append({"type": "end", "time": time.time(), "recovered": True})
+    _append(path, records)
+    logger.info("Recovered run %s: %s open operations", run_id, len(records) - 1, extra={"indent": 0})
+
+
+def undo_run(directory, run_id=None, catalog=None, verify=False):
+    """
+    Reverse the moves and links of a run (the latest one when run_id is None), newest first, and remove
+    the folders it created once they are empty. Videos put back are forgotten by the catalog, and by the
+    SQLite index the run recorded them in when that is another one, so the next run picks them up again.
+    Returns {outcome: count}.
+    """
+    runs = list_runs(directory)
+    if run_id is None:
+        if not runs:
+            raise ValueError(f"No journaled runs in {directory}")
+        run_id = runs[-1]
+    elif run_id not in runs:
+        raise ValueError(f"No journal for run {run_id!r} in {directory}")
+    path = Path(directory) / f"{run_id}{SUFFIX}"
+    with _claimed(path) as claimed:
+        if not claimed:
+            raise ValueError(f"Run {run_id} is still running (or being recovered or undone)")
+        state = _read(path)
+        if not state["end"]:
+            _recover(path, run_id, {})
+        index_db = state["begin"].get("index")
+        if not index_db or (catalog is not None and os.path.abspath(getattr(catalog, "db_path", "")) == index_db):
+            return _undo(path, run_id, [catalog], verify)
+        if not os.path.exists(index_db):
+            logger.warning("Index %s of run %s is gone, its records cannot be forgotten", index_db, run_id, extra={"indent": 0})
+            return _undo(path, run_id, [catalog], verify)
+        from .index import LibraryIndex
+        with LibraryIndex(index_db) as index:
+            return _undo(path, run_id, [catalog, index], verify)
+
+
+def _undo(path, run_id, catalogs, verify):
+    state = _read(path)
+    totals = {}
+    records = []
+
+    def count(key):
+        totals[key] = totals.get(key, 0) + 1
+
+    for seq in sorted(state["outcomes"], reverse=True):
+        outcome = state["outcomes"][seq]
+        if outcome["type"] != "done" or seq in state["undone"]:
+            continue
+        intent = state["intents"][seq]
+        source, dest, mode = intent["source"], intent["dest"], outcome.get("mode", "move")
+        try:
+            if not os.path.lexists(dest):
+                count("gone")
+                logger.warning("Cannot undo %s: %s no longer exists", intent["source"], dest, extra={"indent": 2})
+                continue
+            if mode == "link" and not os.path.lexists(source):
+                # A duplicate linked to a library file that has since been removed is the last copy
+                count("conflict")
+                logger.warning("Cannot undo %s: it is the only copy left of %s", dest, source, extra={"indent": 2})
+                continue
+            if mode != "move" and (os.path.lexists(source) or mode == "symlink"):
+                # Links and copies left the source in place
+                os.unlink(dest)
+            elif os.path.lexists(source):
+                count("conflict")
+                logger.warning("Cannot undo %s: the source path is taken again", source, extra={"indent": 2})
+                continue
+            else:
+                os.makedirs(os.path.dirname(source), exist_ok=True)
+                place_file(dest, source, "move", _same_device(dest, source), verify)
+        except OSError as e:
+            count("error")
+            logger.error("Failed to undo %s -> %s: %s", source, dest, e, extra={"indent": 2})
+            continue
+        if intent.get("kind") == "video" and intent["action"] == "move":
+            for catalog in catalogs:
+                if catalog is not None:
+                    catalog.forget(source)
+        records.append({"type": "undone", "seq": seq})
+        count("undone")
+
+    for directory_path in reversed(state["dirs"]):
+        try:
+            os.rmdir(directory_path)
+            count("folders_removed")
+        except OSError:
+            pass  # Not empty (other files were added) or already gone
+    records.append({"type": "undo", "time": time.time()})
+    _append(path, records)
+    logger.info("Undid run %s: %s", run_id, totals or "nothing to undo", extra={"indent": 0})
+    return totals
@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+"""_summary_:
+Run metrics.
+This module collects per-phase timings (scan, classify, subtitle lookup, catalog write, mkdir, move) and
+counters (files, bytes moved, stat and directory listing calls) for one run, and writes them as JSON or in the
+Prometheus textfile-collector format. Metrics are off by default: get_metrics() then returns a recorder whose
+methods do nothing, so instrumented code costs one attribute lookup and a no-op call per event.
+"""
+
+_NULL_PHASE = nullcontext()
+
+
+class NullMetrics:
+    """Recorder used while metrics are disabled."""
+
+    enabled = False
+
+    def __bool__(self):
+        return False
+
+    def phase(self, name):
+        return _NULL_PHASE
+
+    def timed(self, name, iterable):
+        return iterable
+
+    def add(self, name, value=1):
+        pass
+
+
+class _Phase:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """Timings and counters for one run; safe to update from the move worker threads."""
+
+    enabled = True
+
+    def __init__(self):
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.phases = {}  # name -> [seconds, calls]
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return True
+
+    def phase(self, name):
+        """Context manager adding the time spent in the block to phase `name`."""
+        return _Phase(self, name)
+
+    def timed(self, name, iterable):
+        """Wrap a lazy iterable (e.g. the scanner) so the time spent producing items counts as phase `name`."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start)
+                return
+            self.add_time(name, time.perf_counter() - start)
+            yield item
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            phase = self.phases.get(name)
+            if phase is None:
+                self.phases[name] = [seconds, 1]
+            else:
+                phase[0] += seconds
+                phase[1] += 1
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        with self._lock:
+            phases = {name: {"seconds": round(seconds, 6), "calls": calls} for name, (seconds, calls) in sorted(self.phases.items())}
+            counters = dict(sorted(self.counters.items()))
+        move_seconds = phases.get("move", {}).get("seconds")
+        return {
+            "started": self.started,
+            "duration_seconds": round(time.perf_counter() - self._start, 6),
+            "phases": phases,
+            "counters": counters,
+            "move_bytes_per_second": round(counters.get("bytes_moved", 0) / move_seconds, 1) if move_seconds else None,
+        }
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format, for node_exporter's textfile collector."""
+        data = self.to_dict()
+        lines = [
+            "# HELP vorganize_run_start_timestamp_seconds Unix time the run started.",
+            "# TYPE vorganize_run_start_timestamp_seconds gauge",
+            f"vorganize_run_start_timestamp_seconds {data['started']}",
+            "# HELP vorganize_run_duration_seconds Wall-clock duration of the run.",
+            "# TYPE vorganize_run_duration_seconds gauge",
+            f"vorganize_run_duration_seconds {data['duration_seconds']}",
+            "# HELP vorganize_phase_seconds Time spent in each phase of the run.",
+            "# TYPE vorganize_phase_seconds gauge",
+        ]
+        lines += [f'vorganize_phase_seconds{{phase="{name}"}} {phase["seconds"]}' for name, phase in data["phases"].items()]
+        lines += [
+            "# HELP vorganize_phase_calls Number of timed calls in each phase.",
+            "# TYPE vorganize_phase_calls gauge",
+        ]
+        lines += [f'vorganize_phase_calls{{phase="{name}"}} {phase["calls"]}' for name, phase in data["phases"].items()]
+        for name, value in data["counters"].items():
+            lines += [f"# TYPE vorganize_{name} gauge", f"vorganize_{name} {value}"]
+        if data["move_bytes_per_second"] is not None:
+            lines += [
+                "# HELP vorganize_move_bytes_per_second Bytes moved divided by the time spent moving.",
+                "# TYPE vorganize_move_bytes_per_second gauge",
+                f"vorganize_move_bytes_per_second {data['move_bytes_per_second']}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_file=None, prometheus_file=None):
+        """Write the JSON and/or Prometheus files; each is replaced atomically so collectors never see half a file."""
+        if json_file:
+            _write_atomic(json_file, json.dumps(self.to_dict(), indent=4) + "\n")
+        if prometheus_file:
+            _write_atomic(prometheus_file, self.to_prometheus())
+
+
+def _write_atomic(path, text):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+_active = NullMetrics()
+
+
+def get_metrics():
+    """The recorder for the current run (a NullMetrics unless enable_metrics() was called)."""
+    return _active
+
+
+def enable_metrics():
+    """Start recording metrics and return the new Metrics."""
+    global _active
+    _active = Metrics()
+    return _active
+
+
+def disable_metrics():
+    global _active
+    _active = NullMetrics()
@@ -1,12 +1,18 @@
 import logging
-import shutil
-import sys
-import time
+import os
 from pathlib import Path
 
-from tqdm import tqdm
-
-from .core import extract_series_title, find_subtitle
+from .console import progress_bar
+from .core import (
+    common_subtitle_exts,
+    default_classifier,
+    extract_series_title,
+    find_subtitle,
+    subtitle_list,
+)
+from .executor import MoveJob, MoveScheduler
+from .metrics import get_metrics
+from .plan import MovePlan
 from .storage import store_as_json
 
 logger = logging.getLogger(__name__)
@@ -18,217 +24,371 @@ def prepare_lists(
     series_dict,
     movies,
     other_videos,
-    series_pattern,
-    movie_pattern,
-    movie_pattern2,
-    movie_pattern3,
-    common_subtitle_exts,
-    shows_json,
-    movies_json,
-    other_videos_json,
-    series_pattern2,
+    series_pattern=None,
+    movie_pattern=None,
+    movie_pattern2=None,
+    movie_pattern3=None,
+    common_subtitle_exts=common_subtitle_exts,
+    shows_json=None,
+    movies_json=None,
+    other_videos_json=None,
+    series_pattern2=None,
+    catalog=None,
+    subtitle_index=None,
+    classifier=None,
+    entry=None,
+    prober=None,
 ):
-    """Sort video files into series, movies, or other videos, with subtitles."""
-    subtitle_file = find_subtitle(filename, path, common_subtitle_exts)
+    """
+    Sort video files into series, movies, or other videos, with subtitles.
+    filename may be a path relative to `path` (e.g. a release folder); it is classified
+    by its base name. `entry` is the os.DirEntry from the scanner, if any, to reuse its stat.
+    Names are classified by `classifier` (the default Classifier when no patterns are given);
+    the individual pattern arguments are only used by callers that still pass their own regexes.
+    With a Prober, names that match no rule are classified from the file's headers when possible.
+    Returns the MediaInfo for the file, or None when legacy patterns were used.
+    """
+    metrics = get_metrics()
+    with metrics.phase("subtitle_lookup"):
+        if subtitle_index is not None:
+            subtitle_file = subtitle_index.lookup(filename) or None
+        else:
+            subtitle_file = find_subtitle(filename, path, common_subtitle_exts)
     if subtitle_file:
         logger.info(
-            f"Subtitle found: {filename} -> {subtitle_file}", extra={"indent": 2}
+            "Subtitle found: %s -> %s",
+            filename,
+            ", ".join(subtitle_list(subtitle_file)),
+            extra={"indent": 2},
         )
 
-    if series_pattern.search(filename):
-        series_title, season_number = extract_series_title(filename, series_pattern)
-        if series_title:
-            series_title = series_title.replace(".", " ")
-            series_dict[series_title][season_number].append((filename, subtitle_file))
-            store_as_json("s", (series_title, season_number, filename), shows_json)
-    elif series_pattern2.search(filename):
-        series_title, season_number = extract_series_title(filename, series_pattern2)
-        if series_title:
-            series_title = series_title.replace(".", " ")
-            series_dict[series_title][season_number].append((filename, subtitle_file))
-            store_as_json("s", (series_title, season_number, filename), shows_json)
-
-    elif any(
-        pat.search(filename) for pat in [movie_pattern, movie_pattern2, movie_pattern3]
-    ):
+    name = filename.rpartition("/")[2]
+    info = None
+    with metrics.phase("classify"):
+        if classifier is not None or series_pattern is None:
+            info = (classifier or default_classifier()).classify(name)
+            kind, series_title, season_number = info.kind, info.title, info.season
+        else:
+            kind, series_title, season_number = _legacy_classify(
+                name,
+                series_pattern,
+                series_pattern2,
+                [movie_pattern, movie_pattern2, movie_pattern3],
+            )
+    source = entry if entry is not None else path / filename
+    if kind == "o" and prober is not None and info is not None:
+        probed = prober.classify(source, info, classifier or default_classifier())
+        if probed is not None:
+            info = probed
+            kind, series_title, season_number = info.kind, info.title, info.season
+            metrics.add("probe_reclassified")
+    metrics.add(f"classified_{kind}")
+
+    if kind == "s":
+        logger.debug(
+            "Extracted series '%s' with season %s from '%s'",
+            series_title,
+            season_number,
+            name,
+            extra={"indent": 2},
+        )
+        series_dict[series_title][season_number].append((filename, subtitle_file))
+        with metrics.phase("catalog_write"):
+            store_as_json(
+                "s",
+                (series_title, season_number, name),
+                shows_json,
+                catalog,
+                source=source,
+                subtitle=subtitle_file,
+            )
+    elif kind == "m":
         movies.append((filename, subtitle_file))
-        store_as_json("m", filename, movies_json)
+        with metrics.phase("catalog_write"):
+            store_as_json(
+                "m", name, movies_json, catalog, source=source, subtitle=subtitle_file
+            )
     else:
         other_videos.append((filename, subtitle_file))
-        store_as_json("o", filename, other_videos_json)
+        with metrics.phase("catalog_write"):
+            store_as_json(
+                "o",
+                name,
+                other_videos_json,
+                catalog,
+                source=source,
+                subtitle=subtitle_file,
+            )
+    return info
 
 
-def move_series(series_dict, path, dest_dir):
-    """Move series episodes and subtitles to destination directories with a progress bar."""
-    try:
-        for series_title, seasons in series_dict.items():
-            if not seasons or all(len(episodes) == 0 for episodes in seasons.values()):
+def _legacy_classify(filename, series_pattern, series_pattern2, movie_patterns):
+    """Classify with caller-supplied regexes, returning (kind, series_title, season)."""
+    for pattern in (series_pattern, series_pattern2):
+        if pattern is not None and pattern.search(filename):
+            match = extract_series_title(filename, pattern)
+            if match:
+                series_title, season_number = match
+                return "s", series_title.replace(".", " "), season_number
+    if any(pat is not None and pat.search(filename) for pat in movie_patterns):
+        return "m", None, None
+    return "o", None, None
+
+
+def restore_entry(record, series_dict, movies, other_videos, filename=None):
+    """
+    Queue a file classified by an earlier, interrupted run without classifying it again.
+    filename is the file's current path relative to the source directory (default: record.filename).
+    """
+    entry = (filename or record.filename, record.subtitle)
+    if record.kind == "s":
+        series_dict[record.title][record.season].append(entry)
+    elif record.kind == "m":
+        movies.append(entry)
+    else:
+        other_videos.append(entry)
+
+
+def plan_series(series_dict, path, dest_dir, plan=None, show_index=None):
+    """
+    Add the folders and moves for series episodes and their subtitles to a MovePlan.
+    With a ShowIndex, each series goes to the existing show folder whose normalized title matches.
+    """
+    plan = plan if plan is not None else MovePlan()
+    for series_title, seasons in series_dict.items():
+        if not seasons or all(len(episodes) == 0 for episodes in seasons.values()):
+            logger.warning("Skipping %s: No episodes.", series_title, extra={"indent": 0})
+            continue
+
+        logger.info("Processing %s", series_title, extra={"indent": 0})
+        if show_index is not None:
+            series_title = show_index.resolve(series_title)
+        series_dir = Path(dest_dir) / series_title
+        for season_number, episodes in sorted(seasons.items()):
+            if not episodes:
                 logger.warning(
-                    f"Skipping {series_title}: No episodes.", extra={"indent": 0}
+                    "Skipping Season %s: No episodes.",
+                    season_number,
+                    extra={"indent": 2},
                 )
                 continue
 
-            logger.info(f"Processing {series_title}", extra={"indent": 0})
-            series_dir = Path(dest_dir) / series_title
-            series_dir.mkdir(parents=True, exist_ok=True)
-
-            total_episodes, total_subtitles, skipped, errors = 0, 0, 0, 0
-            # Calculate total episodes for progress bar
-            total_files = sum(len(episodes) for episodes in seasons.values())
-            progress_bar = tqdm(
-                total=total_files,
-                desc=f"Moving {series_title}",
-                unit="file",
-                bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}]",
-            )
+            season_dir = series_dir / f"Season {season_number}"
+            plan.mkdir(season_dir)
+            group = ("shows", series_title, season_number)
+            for video_file, subtitle_file in episodes:
+                source = path / video_file
+                plan.move(source, season_dir / source.name, "video", group, video_file)
+                for subtitle_file in subtitle_list(subtitle_file):
+                    source_sub = path / subtitle_file
+                    plan.move(source_sub, season_dir / source_sub.name, "subtitle", group, subtitle_file)
+    return plan
 
-            for season_number, episodes in sorted(seasons.items()):
-                if not episodes:
-                    logger.warning(
-                        f"Skipping Season {season_number}: No episodes.",
-                        extra={"indent": 2},
-                    )
-                    progress_bar.update(0)  # No files to process, no update needed
-                    continue
-
-                season_dir = series_dir / f"Season {season_number}"
-                season_dir.mkdir(exist_ok=True)
-                season_path = f"{series_title}/Season {season_number}"
-
-                moved_episodes, moved_subtitles = [], []
-                for video_file, subtitle_file in episodes:
-                    # Move video file
-                    source = path / video_file
-                    dest = season_dir / video_file
-                    try:
-                        if dest.exists():
-                            skipped += 1
-                        elif not source.exists():
-                            errors += 1
-                            logger.error(
-                                f"\nVideo missing: {video_file}", extra={"indent": 4}
-                            )
-                        else:
-                            shutil.move(source, dest)
-                            moved_episodes.append(video_file)
-                            time.sleep(0.5)
-                            total_episodes += 1
-                    except (OSError, shutil.Error) as e:
-                        errors += 1
-                        logger.error(
-                            f"\nVideo move failed: {video_file} ({e})",
-                            extra={"indent": 4},
-                        )
-
-                    # Move subtitle file if it exists
-                    if subtitle_file:
-                        source_sub = path / subtitle_file
-                        dest_sub = season_dir / subtitle_file
-                        try:
-                            if dest_sub.exists():
-                                skipped += 1
-                            elif not source_sub.exists():
-                                errors += 1
-                                logger.error(
-                                    f"\nSubtitle missing: {subtitle_file}",
-                                    extra={"indent": 4},
-                                )
-                            else:
-                                shutil.move(source_sub, dest_sub)
-                                moved_subtitles.append(subtitle_file)
-                                total_subtitles += 1
-                        except (OSError, shutil.Error) as e:
-                            errors += 1
-                            logger.error(
-                                f"\nSubtitle move failed: {subtitle_file} ({e})",
-                                extra={"indent": 4},
-                            )
-
-                    progress_bar.update(
-                        1
-                    )  # Update progress after processing each episode
-
-                if moved_episodes or moved_subtitles:
-                    logger.info(
-                        f"\nSeason {season_number}: Moved {len(moved_episodes)} episodes, {len(moved_subtitles)} subtitles to {season_path}",
-                        extra={"indent": 2},
-                    )
-                if skipped > 0:
-                    logger.warning(
-                        f"\nSeason {season_number}: Skipped {skipped} files (already exist)",
-                        extra={"indent": 2},
-                    )
-
-            progress_bar.close()
-            logger.info(
-                f"\nCompleted {series_title}: {total_episodes} episodes, {total_subtitles} subtitles, {skipped} skipped, {errors} errors across {len([s for s in seasons if seasons[s]])} seasons",
+
+def plan_items(items, path, dest_dir, item_type="videos", plan=None):
+    """Add the moves for movies or other videos and their subtitles to a MovePlan."""
+    plan = plan if plan is not None else MovePlan()
+    dest_dir = Path(dest_dir)
+    plan.mkdir(dest_dir)
+    group = (item_type, dest_dir.name)
+    for item, subtitle_file in items:
+        source = path / item
+        plan.move(source, dest_dir / source.name, "video", group, item)
+        for subtitle_file in subtitle_list(subtitle_file):
+            source_sub = path / subtitle_file
+            plan.move(source_sub, dest_dir / source_sub.name, "subtitle", group, subtitle_file)
+    return plan
+
+
+def _label(group, kind):
+    if kind == "subtitle":
+        return "Subtitle"
+    return "Video" if group[0] == "shows" else group[0][:-1]
+
+
+def execute_plan(plan, scheduler=None, catalog=None, journal=None, outcomes=None):
+    """
+    Create the planned folders and run the planned moves behind a single progress bar,
+    then log moved/skipped/error counts per season and series, or per item type.
+    With a Journal, created folders and every move are recorded so a crashed run can be recovered or undone.
+    With a dict as outcomes, the (status, error) of every move and link is stored under its PlanOp.
+    Returns {group: [moved videos, moved subtitles, skipped, errors]}.
+    A KeyboardInterrupt during the moves is re-raised once the counts so far are logged.
+    """
+    scheduler = scheduler or MoveScheduler()
+    metrics = get_metrics()
+    counts = {}
+    jobs = []
+    links = []
+    for op in plan.ops:
+        if op.action == "mkdir":
+            with metrics.phase("mkdir"):
+                if journal is not None:
+                    journal.mkdir(op.dest)
+                else:
+                    os.makedirs(op.dest, exist_ok=True)
+        elif op.action == "skip":
+            _record_skip(op, counts)
+        elif op.action == "link":
+            links.append(op)
+        else:
+            counts.setdefault(op.group, [0, 0, 0, 0])
+            jobs.append(MoveJob(op.source, op.dest, op))
+
+    if journal is not None:
+        journal.intend([job.tag for job in jobs] + links)
+    if jobs:
+        try:
+            with metrics.phase("move"), progress_bar(total=len(jobs), desc="Moving files") as progress:
+                for result in scheduler.run(jobs, checked=True):
+                    _record_result(result, counts, catalog, journal, outcomes)
+                    progress.update(1)
+        except KeyboardInterrupt:
+            logger.warning(
+                "\nKeyboard interrupt detected while moving files. Saving progress and exiting.",
                 extra={"indent": 0},
             )
+            _log_counts(counts)
+            raise
 
-    except KeyboardInterrupt:
-        logger.warning(
-            f"\nKeyboard interrupt detected while moving series '{series_title}'. Saving progress and exiting.",
-            extra={"indent": 0},
-        )
-        progress_bar.close()
-        sys.exit(0)
+    # Duplicates are linked to their existing copy once every move (including that copy's) is done
+    for op in links:
+        _link_duplicate(op, counts, journal, outcomes)
 
+    _log_counts(counts)
+    return counts
 
-def move_items(items, path, dest_dir, item_type="videos"):
-    """Move items (movies or other videos) and subtitles to destination directory."""
-    dest_dir = Path(dest_dir)
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    dest_path = dest_dir.name
-    logger.info(f"Processing {item_type}", extra={"indent": 0})
 
-    moved_items, moved_subtitles, skipped, errors = [], [], 0, 0
-    for item, subtitle_file in items:
-        source = path / item
-        dest = dest_dir / item
-        try:
-            if dest.exists():
-                skipped += 1
-            elif not source.exists():
-                errors += 1
-                logger.error(f"{item_type[:-1]} missing: {item}", extra={"indent": 2})
-            else:
-                shutil.move(source, dest)
-                moved_items.append(item)
-        except (OSError, shutil.Error) as e:
-            errors += 1
+def _link_duplicate(op, counts, journal=None, outcomes=None):
+    group_counts = counts.setdefault(op.group, [0, 0, 0, 0])
+    try:
+        os.link(op.source, op.dest)
+    except FileExistsError:
+        group_counts[2] += 1
+        if journal is not None:
+            journal.record(op, "skipped")
+        if outcomes is not None:
+            outcomes[op] = ("skipped", None)
+        return
+    except OSError as e:
+        group_counts[3] += 1
+        logger.error("Failed to link duplicate %s to %s: %s", op.name, op.source, e, extra={"indent": 2})
+        if journal is not None:
+            journal.record(op, "error")
+        if outcomes is not None:
+            outcomes[op] = ("error", e)
+        return
+    if journal is not None:
+        journal.record(op, "moved", "link")
+    if outcomes is not None:
+        outcomes[op] = ("moved", None)
+    group_counts[0 if op.kind == "video" else 1] += 1
+    get_metrics().add("duplicates_linked")
+
+
+def _record_skip(op, counts):
+    """Count a skip operation of a plan in counts ({group: [videos, subtitles, skipped, errors]})."""
+    group_counts = counts.setdefault(op.group, [0, 0, 0, 0])
+    if op.reason == "missing":
+        group_counts[3] += 1
+        logger.error("%s missing: %s", _label(op.group, op.kind), op.name, extra={"indent": 2})
+    else:
+        group_counts[2] += 1
+
+
+def _record_result(result, counts, catalog=None, journal=None, outcomes=None):
+    """Count the MoveResult of a planned move in counts and record moved videos in the catalog and journal."""
+    op = result.job.tag
+    if journal is not None:
+        journal.record(op, result.status, result.mode)
+    if outcomes is not None:
+        outcomes[op] = (result.status, result.error)
+    group_counts = counts.setdefault(op.group, [0, 0, 0, 0])
+    get_metrics().add(f"{op.kind}s_{result.status}")
+    if result.status == "moved":
+        group_counts[1 if op.kind == "subtitle" else 0] += 1
+        if catalog is not None and op.kind == "video":
+            catalog.mark_moved(op.source, op.dest)
+    elif result.status == "skipped":
+        group_counts[2] += 1
+    else:
+        group_counts[3] += 1
+        label = _label(op.group, op.kind)
+        if result.status == "missing":
+            logger.error("\n%s missing: %s", label, op.name, extra={"indent": 2})
+        else:
             logger.error(
-                f"{item_type[:-1]} move failed: {item} ({e})", extra={"indent": 2}
+                "\n%s move failed: %s (%s)",
+                label,
+                op.name,
+                result.error,
+                extra={"indent": 2},
             )
 
-        if subtitle_file:
-            source_sub = path / subtitle_file
-            dest_sub = dest_dir / subtitle_file
-            try:
-                if dest_sub.exists():
-                    skipped += 1
-                elif not source_sub.exists():
-                    errors += 1
-                    logger.error(
-                        f"Subtitle missing: {subtitle_file}", extra={"indent": 2}
-                    )
-                else:
-                    shutil.move(source_sub, dest_sub)
-                    moved_subtitles.append(subtitle_file)
-            except (OSError, shutil.Error) as e:
-                errors += 1
-                logger.error(
-                    f"Subtitle move failed: {subtitle_file} ({e})", extra={"indent": 2}
-                )
 
-    if moved_items or moved_subtitles:
+def _log_counts(counts):
+    series = {}
+    for group, group_counts in counts.items():
+        if group[0] == "shows":
+            series.setdefault(group[1], []).append((group[2], group_counts))
+            continue
+        item_type, dest_path = group
+        moved_items, moved_subtitles, skipped, errors = group_counts
+        if moved_items or moved_subtitles:
+            logger.info(
+                "Moved %s %s, %s subtitles to %s",
+                moved_items,
+                item_type,
+                moved_subtitles,
+                dest_path,
+                extra={"indent": 0},
+            )
+        if skipped > 0:
+            logger.warning("Skipped %s %s (already exist)", skipped, item_type, extra={"indent": 0})
+        if errors > 0:
+            logger.error("Encountered %s errors", errors, extra={"indent": 0})
+
+    for series_title, season_counts in series.items():
+        season_counts.sort(key=lambda season: season[0])
+        for season_number, (episodes, subtitles, skipped, _) in season_counts:
+            if episodes or subtitles:
+                logger.info(
+                    "Season %s: Moved %s episodes, %s subtitles to %s/Season %s",
+                    season_number,
+                    episodes,
+                    subtitles,
+                    series_title,
+                    season_number,
+                    extra={"indent": 2},
+                )
+            if skipped > 0:
+                logger.warning(
+                    "Season %s: Skipped %s files (already exist)",
+                    season_number,
+                    skipped,
+                    extra={"indent": 2},
+                )
+        total_episodes, total_subtitles, skipped, errors = (
+            sum(c[i] for _, c in season_counts) for i in range(4)
+        )
         logger.info(
-            f"Moved {len(moved_items)} {item_type}, {len(moved_subtitles)} subtitles to {dest_path}",
+            "Completed %s: %s episodes, %s subtitles, %s skipped, %s errors across %s seasons",
+            series_title,
+            total_episodes,
+            total_subtitles,
+            skipped,
+            errors,
+            len(season_counts),
             extra={"indent": 0},
         )
-    if skipped > 0:
-        logger.warning(
-            f"Skipped {skipped} {item_type} (already exist)", extra={"indent": 0}
-        )
-    if errors > 0:
-        logger.error(f"Encountered {errors} errors", extra={"indent": 0})
 
+
+def move_series(series_dict, path, dest_dir, catalog=None, scheduler=None, show_index=None):
+    """Move series episodes and subtitles to destination directories with a progress bar."""
+    return execute_plan(plan_series(series_dict, path, dest_dir, show_index=show_index), scheduler, catalog)
+
+
+def move_items(items, path, dest_dir, item_type="videos", catalog=None, scheduler=None):
+    """Move items (movies or other videos) and subtitles to destination directory."""
+    logger.info("Processing %s", item_type, extra={"indent": 0})
+    return execute_plan(plan_items(items, path, dest_dir, item_type), scheduler, catalog)
@@ -0,0 +1,217 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, namedtuple
+from pathlib import Path
+from .core import VIDEO_EXTS, Classifier, SubtitleIndex, common_subtitle_exts
+from .executor import MoveScheduler, Throttle
+from .organize import execute_plan, plan_items, plan_series, prepare_lists, restore_entry
+from .plan import MovePlan
+from .storage import DEFAULT_SCRIPT_DIR, JsonCatalog
+from .titles import ShowIndex
+"""_summary_:
+Embeddable organizer.
+This module keeps everything a run sets up (compiled classification rules, the open catalog or index, the
+show-folder index, the move scheduler and the duplicate index) in one Organizer object, so a long-lived
+process such as a download manager's post-processing hook can organize single files or small batches
+without paying the startup cost again. Each call plans and moves its files like a small run and returns one
+OrganizeResult per path. The factories below build the same pieces for the command line.
+"""
+
+logger = logging.getLogger(__name__)
+
+# status: "moved", "linked" (hardlinked to an existing duplicate), "duplicate" (skipped), "exists" (destination
+# taken), "unchanged" (already moved by an earlier run), "missing", "ignored" (not a video) or "error"
+OrganizeResult = namedtuple("OrganizeResult", "source kind title season destination status error", defaults=(None,))
+
+
+def library_folders(dest_dir):
+    """Destination folder of each kind: "s" shows, "m" Movies, "o" other_videos."""
+    dest_dir = Path(dest_dir)
+    return {"s": dest_dir / "shows", "m": dest_dir / "Movies", "o": dest_dir / "other_videos"}
+
+
+def open_catalog(script_dir, index_db=None, flush_every=500, classifier=None):
+    """The SQLite index when index_db is given (importing the JSON catalog into a new one), else the JSON catalog."""
+    if not index_db:
+        return JsonCatalog(flush_every=flush_every, lock_dir=script_dir)
+    from .index import LibraryIndex
+    catalog = LibraryIndex(index_db, flush_every=flush_every, classifier=classifier)
+    if catalog.created:
+        catalog.import_json(script_dir)
+    return catalog
+
+
+def make_scheduler(jobs=4, per_device=1, max_rate=None, max_files=None, link_mode="move", verify=False):
+    """MoveScheduler with the throttle for max_rate (MB/s) and max_files (files/s)."""
+    throttle = Throttle(mb_per_second=max_rate, files_per_second=max_files)
+    return MoveScheduler(max_workers=jobs, per_device=per_device, throttle=throttle, link_mode=link_mode, verify=verify)
+
+
+def make_deduper(library_dirs, mode, script_dir, jobs=4, dedupe_sample=4, video_ext=VIDEO_EXTS):
+    """Deduper over library_dirs with its fingerprint cache in script_dir; dedupe_sample is in MB."""
+    from .dedupe import Deduper, FingerprintCache
+    cache = FingerprintCache(Path(script_dir) / "fingerprints.db")
+    return Deduper(library_dirs, mode=mode, cache=cache, workers=jobs, sample=int(dedupe_sample * 1024 * 1024), video_ext=video_ext)
+
+
+def make_prober(catalog, movie_minutes=70):
+    """Prober caching its results in catalog when it is the SQLite index."""
+    from .probe import Prober
+    return Prober(cache=catalog if hasattr(catalog, "store_probe") else None, movie_minutes=movie_minutes)
+
+
+class Organizer:
+    """
+    Organize video files into dest_dir (shows, Movies, other_videos) with state kept between calls.
+    The options are the ones of the command line. index_db is recommended: the SQLite index is committed
+    after every call, and files already moved are reported as unchanged; the JSON catalog is only rewritten
+    every flush_interval seconds (and on close). One journal is kept for up to journal_batches calls, and
+    finished journals older than journal_keep_days are deleted. Use as a context manager, or call close().
+    Calls may come from any thread (e.g. a download manager's worker threads); they are serialized, so
+    one batch is planned and moved at a time.
+    """
+
+    def __init__(self, dest_dir, script_dir=DEFAULT_SCRIPT_DIR, index_db=None, rules_file=None, classifier=None, flush_every=500, flush_interval=60.0, jobs=4, per_device=1, max_rate=None, max_files=None, link_mode="move", verify=False, journal=True, journal_batches=1000, journal_keep_days=30, dedupe=None, dedupe_sample=4, fuzzy_titles=None, probe=False, movie_minutes=70, video_ext=VIDEO_EXTS, subtitle_exts=common_subtitle_exts):
+        self.script_dir = Path(script_dir)
+        self.classifier = classifier or (Classifier.from_file(rules_file) if rules_file else Classifier())
+        self.video_ext = {ext.lower() for ext in video_ext}
+        self.subtitle_exts = subtitle_exts
+        self.catalog = open_catalog(self.script_dir, index_db, flush_every, self.classifier)
+        self.index_db = index_db
+        self.json_files = {kind: self.script_dir / name for kind, name in (("s", "shows.json"), ("m", "movies.json"), ("o", "other_videos.json"))}
+        self.flush_interval = flush_interval
+        self._flushed = time.monotonic()
+
+        self.category_map = library_folders(dest_dir)
+        for directory in self.category_map.values():
+            directory.mkdir(parents=True, exist_ok=True)
+        self.show_index = ShowIndex(self.category_map["s"], fuzzy=fuzzy_titles)
+        self.prober = make_prober(self.catalog, movie_minutes) if probe else None
+        self.deduper = make_deduper(self.category_map.values(), dedupe, self.script_dir, jobs, dedupe_sample, video_ext) if dedupe else None
+        self.scheduler = make_scheduler(jobs, per_device, max_rate, max_files, link_mode, verify)
+        self.link_mode = link_mode
+        self.journal_dir = self.script_dir / "journal" if journal else None
+        self.journal_batches = journal_batches
+        self.journal_keep_days = journal_keep_days
+        self._journal = None
+        self._journaled = 0
+        self._batches = itertools.count(1)
+        self._rotations = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def organize_file(self, path):
+        """Organize one video file (with the subtitles next to it); returns its OrganizeResult."""
+        return self.organize_batch([path])[0]
+
+    def organize_batch(self, paths):
+        """
+        Organize video files given by path, moved together as one batch of the journal (waiting for a
+        call running on another thread); returns one OrganizeResult per path, in the same order.
+        """
+        with self._lock:
+            return self._organize_batch(paths)
+
+    def _organize_batch(self, paths):
+        paths = [os.path.abspath(os.fspath(path)) for path in paths]
+        results = {}
+        infos = {}  # path -> (kind, title, season)
+        by_dir = defaultdict(list)
+        for path in dict.fromkeys(paths):
+            if path.rpartition(".")[2].lower() not in self.video_ext:
+                results[path] = OrganizeResult(path, None, None, None, None, "ignored")
+            elif not os.path.isfile(path):
+                results[path] = OrganizeResult(path, None, None, None, None, "missing")
+            else:
+                by_dir[os.path.dirname(path)].append(os.path.basename(path))
+
+        plan = MovePlan()
+        for directory, names in by_dir.items():
+            source = Path(directory)
+            # Subtitles are looked up next to each video (and in its Subs/ folder), listed once per folder
+            subtitle_index = SubtitleIndex(source, self.subtitle_exts)
+            subtitle_index.scan_dir("")
+            series_dict = defaultdict(lambda: defaultdict(list))
+            movies, other_videos = [], []
+            for name in names:
+                path = os.path.join(directory, name)
+                record = self.catalog.lookup(path)
+                if record is not None and record.status == "moved":
+                    results[path] = OrganizeResult(path, record.kind, record.title, record.season, record.destination, "unchanged")
+                elif record is not None:
+                    restore_entry(record, series_dict, movies, other_videos, filename=name)
+                    infos[path] = (record.kind, record.title, record.season)
+                else:
+                    info = prepare_lists(name, source, series_dict, movies, other_videos, common_subtitle_exts=self.subtitle_exts, shows_json=self.json_files["s"], movies_json=self.json_files["m"], other_videos_json=self.json_files["o"], catalog=self.catalog, subtitle_index=subtitle_index, classifier=self.classifier, prober=self.prober)
+                    infos[path] = (info.kind, info.title, info.season)
+            plan_series(series_dict, source, self.category_map["s"], plan, self.show_index)
+            plan_items(movies, source, self.category_map["m"], "movies", plan)
+            plan_items(other_videos, source, self.category_map["o"], "videos", plan)
+
+        # Duplicates are rewritten in place (a link's source is the existing copy), so remember the inputs by position
+        planned = [(i, op.source) for i, op in enumerate(plan.ops) if op.kind == "video" and op.source in infos]
+        if self.deduper is not None:
+            self.deduper.apply(plan)
+        outcomes = {}
+        batch = next(self._batches)
+        journal = self._batch_journal() if any(op.action in ("move", "link") for op in plan.ops) else None
+        if journal is not None:
+            journal.mark("batch", batch=batch)
+        try:
+            execute_plan(plan, self.scheduler, self.catalog, journal, outcomes)
+        finally:
+            self._flush()
+
+        for i, source in planned:
+            op = plan.ops[i]
+            status, error = outcomes.get(op, (op.reason, None))
+            if op.action == "link":
+                status = {"moved": "linked", "skipped": "exists"}.get(status, status)
+            elif status == "skipped":
+                status = "exists"
+            results[source] = OrganizeResult(source, *infos[source], op.dest, status, error)
+        return [results.get(path) or OrganizeResult(path, *infos.get(path, (None, None, None)), None, "error", "not planned") for path in paths]
+
+    def _batch_journal(self):
+        """The journal of the current call: one is shared by up to journal_batches calls, then rotated."""
+        if self.journal_dir is None:
+            return None
+        if self._journal is not None and self._journaled >= self.journal_batches:
+            self._close_journal()
+        if self._journal is None:
+            from .journal import Journal, prune_runs
+            prune_runs(self.journal_dir, self.journal_keep_days)
+            # The counter keeps ids unique and ordered when journals rotate within one second
+            run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._rotations):06d}"
+            self._journal = Journal(self.journal_dir, run_id=run_id, link_mode=self.link_mode, index_db=self.index_db)
+            self._journaled = 0
+        self._journaled += 1
+        return self._journal
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _flush(self):
+        """Commit the index after every call; rewrite the JSON catalog at most every flush_interval seconds."""
+        if isinstance(self.catalog, JsonCatalog) and time.monotonic() - self._flushed < self.flush_interval:
+            return
+        self.catalog.flush()
+        self._flushed = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._close_journal()
+            self.catalog.close()
+            if self.deduper is not None:
+                self.deduper.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
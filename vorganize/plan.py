@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+
+from .metrics import get_metrics
+"""_summary_:
+Move plans.
+This module builds the full list of operations (mkdir, move, skip) for a run before anything is touched.
+Conflicts are found by reading each destination directory once into a set instead of stat-ing every file,
+and a plan can be written to JSON for review (--dry-run) and executed later (--apply plan.json).
+"""
+
+logger = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+
+# action: "mkdir", "move" or "skip"; kind: "video" or "subtitle"; group: ["shows", title, season] or [item_type];
+# reason: why an operation is skipped ("exists" or "missing")
+PlanOp = namedtuple("PlanOp", "action source dest kind group name reason")
+
+
+class MovePlan:
+    """An ordered list of PlanOps plus the catalog records that go with them."""
+
+    def __init__(self, ops=None, records=None, created=None):
+        self.ops = list(ops or [])
+        self.records = list(records or [])
+        self.created = created or time.time()
+        self._listings = {}
+        self._dirs = set()
+
+    def _listing(self, directory):
+        """Names in directory, read once per plan; a missing directory is empty."""
+        names = self._listings.get(directory)
+        if names is None:
+            get_metrics().add("listdir_calls")
+            try:
+                names = set(os.listdir(directory))
+            except (FileNotFoundError, NotADirectoryError):
+                names = set()
+            self._listings[directory] = names
+        return names
+
+    def mkdir(self, directory):
+        directory = os.path.abspath(directory)
+        if directory not in self._dirs:
+            self._dirs.add(directory)
+            self.ops.append(PlanOp("mkdir", None, directory, None, None, None, None))
+
+    def move(self, source, dest, kind, group, name):
+        """Plan moving source to dest, or a skip when dest is taken or source is gone."""
+        op = self._check(source, dest, kind, group, name)
+        self.ops.append(op)
+        return op
+
+    def _check(self, source, dest, kind, group, name):
+        source, dest = os.path.abspath(source), os.path.abspath(dest)
+        source_dir, source_name = os.path.split(source)
+        dest_dir, dest_name = os.path.split(dest)
+        dest_names = self._listing(dest_dir)
+        if dest_name in dest_names:
+            op = PlanOp("skip", source, dest, kind, group, name, "exists")
+        elif source_name not in self._listing(source_dir):
+            op = PlanOp("skip", source, dest, kind, group, name, "missing")
+        else:
+            op = PlanOp("move", source, dest, kind, group, name, None)
+            # Later operations in the same plan must not target this name either
+            dest_names.add(dest_name)
+            self._listing(source_dir).discard(source_name)
+        return op
+
+    def revalidate(self):
+        """Re-check a plan loaded from disk against the current directory listings."""
+        self._listings = {}
+        self.ops = [
+            self._check(op.source, op.dest, op.kind, op.group, op.name) if op.action == "move" else op
+            for op in self.ops
+        ]
+
+    def counts(self):
+        result = {}
+        for op in self.ops:
+            key = op.action if op.action != "skip" else f"skip ({op.reason})"
+            result[key] = result.get(key, 0) + 1
+        return result
+
+    def to_dict(self):
+        return {
+            "version": PLAN_VERSION,
+            "created": self.created,
+            "ops": [{k: v for k, v in op._asdict().items() if v is not None} for op in self.ops],
+            "catalog": self.records,
+        }
+
+    def dump(self, plan_file):
+        """Write the plan as JSON to plan_file ("-" for stdout)."""
+        text = json.dumps(self.to_dict(), indent=4)
+        if plan_file == "-":
+            print(text)
+            return
+        tmp = f"{plan_file}.tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, plan_file)
+
+    @classmethod
+    def load(cls, plan_file):
+        with open(plan_file, "r") as f:
+            data = json.load(f)
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version {data.get('version')!r} in {plan_file}")
+        ops = [PlanOp(**{field: op.get(field) for field in PlanOp._fields}) for op in data["ops"]]
+        for i, op in enumerate(ops):
+            if op.group is not None:
+                ops[i] = op._replace(group=tuple(op.group))
+        return cls(ops, data.get("catalog"), data.get("created"))
+
+    def replay_catalog(self, catalog):
+        """Store the catalog records collected while the plan was built."""
+        for video_type, data, json_file, source, subtitle in self.records:
+            if source is not None and not os.path.exists(source):
+                source = None
+            catalog.store(video_type, tuple(data) if video_type == "s" else data, json_file, source=source, subtitle=subtitle)
+
+
+class DeferredCatalog:
+    """
+    Catalog wrapper for dry runs: lookups go to the real catalog, writes are kept in the plan
+    and only applied when the plan is executed.
+    """
+
+    def __init__(self, plan, catalog):
+        self.plan = plan
+        self.catalog = catalog
+
+    def store(self, video_type, data, json_file, source=None, subtitle=None):
+        self.plan.records.append(
+            [
+                video_type,
+                list(data) if video_type == "s" else data,
+                os.fspath(json_file) if json_file is not None else None,
+                os.path.abspath(os.fspath(source)) if source is not None else None,
+                list(subtitle) if isinstance(subtitle, (list, tuple)) else subtitle,
+            ]
+        )
+
+    def lookup(self, source, st=None):
+        return self.catalog.lookup(source, st)
+
+    def mark_moved(self, source, destination):
+        pass
+
+    def flush(self):
+        pass
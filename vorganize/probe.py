@@ -0,0 +1,306 @@
+import logging
+import mmap
+import os
+import struct
+from collections import namedtuple
+from pathlib import Path
+from .metrics import get_metrics
+"""_summary_:
+Container header probing.
+This module reads the duration, video resolution and embedded title of MKV/WebM and MP4/MOV files without
+ffprobe. The file is memory-mapped with read-ahead disabled and only the element headers that lead to the
+metadata are touched: the EBML header, Segment Info and Tracks of a Matroska file (following its SeekHead when
+they come after the clusters), or the top-level atoms up to moov/mvhd, tkhd and the ilst title of an MP4,
+wherever moov sits in the file. That is a few KB per file, even on large files and slow disks.
+Probe results can be cached in the SQLite index and give the classifier a fallback for names matching no rule.
+"""
+
+logger = logging.getLogger(__name__)
+
+ProbeInfo = namedtuple("ProbeInfo", "duration width height title")
+EMPTY_PROBE = ProbeInfo(None, None, None, None)
+
+# Stop walking a file after this many elements/atoms, whatever it contains
+MAX_ELEMENTS = 512
+
+# Matroska element IDs (with their length marker bits)
+EBML = 0x1A45DFA3
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TITLE = 0x7BA9
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_TYPE = 0x83
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CLUSTER = 0x1F43B675
+
+MP4_TOP_LEVEL = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot", b"uuid"}
+
+
+def _vint(buf, pos, keep_marker=False):
+    """Read an EBML variable-size integer; returns (value, next position), value None for an unknown size."""
+    first = buf[pos]
+    if not first:
+        raise ValueError("invalid EBML vint")
+    length = 9 - first.bit_length()
+    value = first if keep_marker else first & ((1 << (8 - length)) - 1)
+    for byte in buf[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None
+    return value, pos + length
+
+
+def _elements(buf, start, end):
+    """Yield (id, data start, data end) for the EBML elements between start and end."""
+    pos = start
+    for _ in range(MAX_ELEMENTS):
+        if pos >= end:
+            return
+        element_id, pos = _vint(buf, pos, keep_marker=True)
+        size, pos = _vint(buf, pos)
+        data_end = end if size is None else min(pos + size, end)
+        yield element_id, pos, data_end
+        if size is None:
+            return
+        pos = data_end
+
+
+def _uint(buf, start, end):
+    return int.from_bytes(buf[start:end], "big")
+
+
+def _mkv_info(buf, start, end, found):
+    scale, duration = 1000000, None
+    for element_id, data, data_end in _elements(buf, start, end):
+        if element_id == TIMECODE_SCALE:
+            scale = _uint(buf, data, data_end)
+        elif element_id == DURATION:
+            duration = struct.unpack(">f" if data_end - data == 4 else ">d", buf[data:data_end])[0]
+        elif element_id == TITLE:
+            found["title"] = buf[data:data_end].decode("utf-8", "replace").strip("\0 ") or None
+    if duration:
+        found["duration"] = duration * scale / 1e9
+
+
+def _mkv_tracks(buf, start, end, found):
+    for element_id, data, data_end in _elements(buf, start, end):
+        if element_id != TRACK_ENTRY:
+            continue
+        track_type, width, height = None, None, None
+        for child_id, child, child_end in _elements(buf, data, data_end):
+            if child_id == TRACK_TYPE:
+                track_type = _uint(buf, child, child_end)
+            elif child_id == VIDEO:
+                for video_id, value, value_end in _elements(buf, child, child_end):
+                    if video_id == PIXEL_WIDTH:
+                        width = _uint(buf, value, value_end)
+                    elif video_id == PIXEL_HEIGHT:
+                        height = _uint(buf, value, value_end)
+        if track_type == 1 and width and height:
+            found["width"], found["height"] = width, height
+            return
+
+
+def _probe_mkv(buf):
+    _, pos = _vint(buf, 0, keep_marker=True)
+    size, pos = _vint(buf, pos)
+    if size is None:
+        return EMPTY_PROBE
+    element_id, pos = _vint(buf, pos + size, keep_marker=True)
+    if element_id != SEGMENT:
+        return EMPTY_PROBE
+    size, segment = _vint(buf, pos)
+    segment_end = len(buf) if size is None else min(segment + size, len(buf))
+
+    found, seeks, parsers = {}, {}, {INFO: _mkv_info, TRACKS: _mkv_tracks}
+    for element_id, data, data_end in _elements(buf, segment, segment_end):
+        if element_id == CLUSTER:
+            break
+        if element_id in parsers:
+            parsers.pop(element_id)(buf, data, data_end, found)
+        elif element_id == SEEK_HEAD:
+            for seek_id, seek, seek_end in _elements(buf, data, data_end):
+                if seek_id != SEEK:
+                    continue
+                target = position = None
+                for child_id, child, child_end in _elements(buf, seek, seek_end):
+                    if child_id == SEEK_ID:
+                        target = _uint(buf, child, child_end)
+                    elif child_id == SEEK_POSITION:
+                        position = _uint(buf, child, child_end)
+                if target is not None and position is not None:
+                    seeks.setdefault(target, segment + position)
+    # Info or Tracks written after the clusters: jump there through the SeekHead
+    for element_id, parse in parsers.items():
+        if element_id in seeks and seeks[element_id] < segment_end:
+            for found_id, data, data_end in _elements(buf, seeks[element_id], segment_end):
+                if found_id == element_id:
+                    parse(buf, data, data_end, found)
+                break
+    return ProbeInfo(found.get("duration"), found.get("width"), found.get("height"), found.get("title"))
+
+
+def _atoms(buf, start, end):
+    """Yield (type, data start, atom end) for the MP4 atoms between start and end."""
+    pos = start
+    for _ in range(MAX_ELEMENTS):
+        if pos + 8 > end:
+            return
+        size, kind = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield kind, pos + header, min(pos + size, end)
+        pos += size
+
+
+def _mp4_track(buf, start, end):
+    """(handler type, width, height) of a trak atom."""
+    handler, width, height = None, None, None
+    for kind, data, atom_end in _atoms(buf, start, end):
+        if kind == b"tkhd":
+            offset = 88 if buf[data] == 1 else 76
+            if data + offset + 8 <= atom_end:
+                width, height = (value >> 16 for value in struct.unpack_from(">II", buf, data + offset))
+        elif kind == b"mdia":
+            for child, child_data, child_end in _atoms(buf, data, atom_end):
+                if child == b"hdlr" and child_data + 12 <= child_end:
+                    handler = buf[child_data + 8:child_data + 12]
+    return handler, width, height
+
+
+def _mp4_title(buf, start, end):
+    """Title from udta/meta/ilst/©nam (iTunes style) or udta/©nam (QuickTime style)."""
+    for kind, data, atom_end in _atoms(buf, start, end):
+        if kind == b"\xa9nam" and data + 4 <= atom_end and buf[data + 4:data + 8] != b"data":
+            # QuickTime: 16-bit length, 16-bit language, text
+            length = struct.unpack_from(">H", buf, data)[0]
+            return buf[data + 4:min(data + 4 + length, atom_end)].decode("utf-8", "replace")
+        if kind == b"meta":
+            # The iTunes meta atom is a full atom (version and flags before its children), QuickTime's is not
+            children = data if buf[data + 4:data + 8] == b"hdlr" else data + 4
+            for child, child_data, child_end in _atoms(buf, children, atom_end):
+                if child != b"ilst":
+                    continue
+                for item, item_data, item_end in _atoms(buf, child_data, child_end):
+                    if item != b"\xa9nam":
+                        continue
+                    for value, value_data, value_end in _atoms(buf, item_data, item_end):
+                        if value == b"data":
+                            return buf[value_data + 8:value_end].decode("utf-8", "replace")
+    return None
+
+
+def _probe_mp4(buf):
+    for kind, data, end in _atoms(buf, 0, len(buf)):
+        if kind not in MP4_TOP_LEVEL:
+            return EMPTY_PROBE
+        if kind != b"moov":
+            continue
+        duration = width = height = title = None
+        for child, child_data, child_end in _atoms(buf, data, end):
+            if child == b"mvhd":
+                if buf[child_data] == 1:
+                    timescale, length = struct.unpack_from(">IQ", buf, child_data + 20)
+                else:
+                    timescale, length = struct.unpack_from(">II", buf, child_data + 12)
+                if timescale and length not in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+                    duration = length / timescale
+            elif child == b"trak":
+                handler, track_width, track_height = _mp4_track(buf, child_data, child_end)
+                if track_width and track_height and (width is None or handler == b"vide"):
+                    width, height = track_width, track_height
+            elif child == b"udta":
+                title = _mp4_title(buf, child_data, child_end) or title
+        return ProbeInfo(duration, width, height, title.strip("\0 ") if title else None)
+    return EMPTY_PROBE
+
+
+def probe_file(path):
+    """
+    Duration (seconds), video width/height and embedded title of an MKV/WebM or MP4/MOV file as a ProbeInfo.
+    Fields that cannot be read are None; other formats and damaged headers give EMPTY_PROBE.
+    """
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            return EMPTY_PROBE
+    with mapped:
+        if hasattr(mapped, "madvise"):
+            # Fault in only the pages holding headers, not the usual read-around window
+            mapped.madvise(mmap.MADV_RANDOM)
+        try:
+            if mapped[:4] == b"\x1a\x45\xdf\xa3":
+                return _probe_mkv(mapped)
+            if mapped[4:8] in MP4_TOP_LEVEL:
+                return _probe_mp4(mapped)
+            return EMPTY_PROBE
+        except (IndexError, ValueError, struct.error):
+            return EMPTY_PROBE
+
+
+class Prober:
+    """
+    Probe videos whose names match no rule and suggest a classification from their headers.
+    cache is a LibraryIndex (or None) remembering results by path, size and mtime;
+    files of at least movie_minutes without a usable embedded title are taken for movies.
+    """
+
+    def __init__(self, cache=None, movie_minutes=70):
+        self.cache = cache
+        self.movie_minutes = movie_minutes
+
+    def probe(self, source):
+        """ProbeInfo for source (a path or os.DirEntry), from the cache when the file is unchanged."""
+        metrics = get_metrics()
+        try:
+            metrics.add("stat_calls")
+            st = source.stat() if isinstance(source, os.DirEntry) else os.stat(source)
+        except OSError:
+            return EMPTY_PROBE
+        if self.cache is not None:
+            info = self.cache.lookup_probe(source, st)
+            if info is not None:
+                metrics.add("probes_cached")
+                return info
+        with metrics.phase("probe"):
+            try:
+                info = probe_file(os.fspath(source))
+            except OSError as e:
+                logger.error("Failed to probe %s: %s", os.fspath(source), e, extra={"indent": 2})
+                return EMPTY_PROBE
+        metrics.add("probed")
+        if self.cache is not None:
+            self.cache.store_probe(source, st, info)
+        return info
+
+    def classify(self, source, info, classifier):
+        """
+        A better MediaInfo than info (the filename classification of an "o" video), or None.
+        The embedded title is classified like a filename first; otherwise a long enough video is a movie.
+        """
+        probed = self.probe(source)
+        if probed.title:
+            guess = classifier.classify(probed.title)
+            if guess.kind != "o":
+                logger.debug("Classified %s by its embedded title %r", os.fspath(source), probed.title, extra={"indent": 2})
+                return guess
+        if probed.duration and probed.duration >= self.movie_minutes * 60:
+            logger.debug("Classified %s as a movie by its duration (%d min)", os.fspath(source), probed.duration // 60, extra={"indent": 2})
+            return info._replace(kind="m", title=probed.title or Path(os.fspath(source)).stem)
+        return None
@@ -0,0 +1,184 @@
+import logging
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from pathlib import Path
+from .core import VIDEO_EXTS, Classifier
+from .metrics import get_metrics
+from .titles import normalize_title, strip_season
+"""_summary_:
+Library queries.
+This module answers questions about the organized library from the episodes table of the SQLite index, which
+the organizer fills as it moves episodes: shows and their seasons, the episodes of a show, missing episode
+numbers per season, recent additions and sizes. Each answer is one indexed query, without touching the
+library itself. When the index is new or out of date, rebuild_episodes() lists the show folders in parallel and
+records every episode found.
+"""
+
+logger = logging.getLogger(__name__)
+
+EpisodeRow = namedtuple("EpisodeRow", "show season episode path size added")
+ShowRow = namedtuple("ShowRow", "show seasons episodes size added")
+GapRow = namedtuple("GapRow", "show season last missing")
+SizeRow = namedtuple("SizeRow", "show season episodes size")
+
+_season_dir = re.compile(r"^season[\s._-]*(\d{1,3})$", re.IGNORECASE)
+_season_number = re.compile(r"\d+")
+
+
+def parse_show(text):
+    """(title, season) of a query such as "Severance S02" or "Severance"; season is None when not given."""
+    title = strip_season(text)
+    numbers = _season_number.findall(text[len(title):])
+    return title, int(numbers[0]) if len(numbers) == 1 else None
+
+
+class LibraryQuery:
+    """Read-only queries over the episodes recorded in a LibraryIndex."""
+
+    def __init__(self, index):
+        self.index = index
+        self.conn = index.conn
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM episodes").fetchone()[0]
+
+    def find_show(self, title):
+        """Show folder name for title: the exact name, else the one with the same normalized title, else None."""
+        row = self.conn.execute("SELECT show FROM episodes WHERE show = ? LIMIT 1", (title,)).fetchone()
+        if row is not None:
+            return row[0]
+        key = normalize_title(title)
+        for (show,) in self.conn.execute("SELECT DISTINCT show FROM episodes ORDER BY length(show), show"):
+            if normalize_title(show) == key:
+                return show
+        return None
+
+    @staticmethod
+    def _where(show=None, season=None, since=None):
+        clauses, params = [], []
+        for clause, value in (("show = ?", show), ("season = ?", season), ("added >= ?", since)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def shows(self):
+        """ShowRows: number of seasons and episodes, total size and latest addition per show."""
+        return [
+            ShowRow(*row)
+            for row in self.conn.execute(
+                "SELECT show, COUNT(DISTINCT season), COUNT(*), SUM(size), MAX(added) FROM episodes GROUP BY show ORDER BY show"
+            )
+        ]
+
+    def episodes(self, show=None, season=None):
+        """EpisodeRows of a show (and season), or of the whole library, in show/season/episode order."""
+        where, params = self._where(show, season)
+        return [
+            EpisodeRow(*row)
+            for row in self.conn.execute(
+                "SELECT show, season, episode, path, size, added FROM episodes" + where
+                + " ORDER BY show, season, episode, path",
+                params,
+            )
+        ]
+
+    def gaps(self, show=None, season=None):
+        """
+        GapRows for seasons with missing episode numbers between 1 and the last episode present.
+        Episodes after the last one present cannot be told apart from episodes not aired yet.
+        """
+        where, params = self._where(show, season)
+        rows = self.conn.execute(
+            "SELECT DISTINCT show, season, episode FROM episodes" + where
+            + (" AND" if where else " WHERE") + " episode IS NOT NULL ORDER BY show, season, episode",
+            params,
+        )
+        gaps = []
+        for (show_name, season_number), episodes in groupby(rows, key=lambda row: (row[0], row[1])):
+            present = [episode for _, _, episode in episodes]
+            missing = sorted(set(range(1, present[-1] + 1)).difference(present))
+            if missing:
+                gaps.append(GapRow(show_name, season_number, present[-1], missing))
+        return gaps
+
+    def recent(self, since):
+        """EpisodeRows added since a timestamp, newest first."""
+        return [
+            EpisodeRow(*row)
+            for row in self.conn.execute(
+                "SELECT show, season, episode, path, size, added FROM episodes WHERE added >= ? ORDER BY added DESC, path",
+                (since,),
+            )
+        ]
+
+    def sizes(self, show=None):
+        """SizeRows with the number of episodes and total bytes per show and season."""
+        where, params = self._where(show)
+        return [
+            SizeRow(*row)
+            for row in self.conn.execute(
+                "SELECT show, season, COUNT(*), SUM(size) FROM episodes" + where + " GROUP BY show, season ORDER BY show, season",
+                params,
+            )
+        ]
+
+
+def _scan_show(show_dir, classifier, video_ext):
+    """(path, season, episode, size, added) of the videos in one show folder and its season folders."""
+    rows = []
+    stack = [(show_dir, None)]
+    while stack:
+        directory, folder_season = stack.pop()
+        get_metrics().add("scandir_calls")
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        match = _season_dir.match(entry.name)
+                        stack.append((entry.path, int(match.group(1)) if match else folder_season))
+                        continue
+                    if entry.name.rpartition(".")[2].lower() not in video_ext or not entry.is_file():
+                        continue
+                    info = classifier.classify(entry.name)
+                    season = folder_season if folder_season is not None else info.season
+                    if season is None:
+                        continue
+                    st = entry.stat()
+                    # A move keeps the mtime of the download but sets the ctime, the best guess of when it was added
+                    rows.append((entry.path, season, info.episode, st.st_size, st.st_ctime))
+        except OSError as e:
+            logger.error("Failed to scan %s: %s", directory, e, extra={"indent": 2})
+    return rows
+
+
+def rebuild_episodes(index, shows_dir, classifier=None, workers=8, video_ext=VIDEO_EXTS):
+    """
+    Replace the episodes of index with the ones found below shows_dir, one show folder per worker;
+    returns the number of episodes recorded.
+    """
+    classifier = classifier or Classifier()
+    video_ext = {ext.lower() for ext in video_ext}
+    try:
+        with os.scandir(shows_dir) as entries:
+            shows = sorted(entry.name for entry in entries if entry.is_dir() and not entry.name.startswith("."))
+    except FileNotFoundError:
+        shows = []
+    metrics = get_metrics()
+    with metrics.phase("scan"), ThreadPoolExecutor(max(1, workers), thread_name_prefix="vorganize-rebuild") as pool:
+        found = pool.map(lambda show: _scan_show(Path(shows_dir) / show, classifier, video_ext), shows)
+        # Rows are written from this thread, which owns the SQLite connection
+        index.clear_episodes()
+        count = 0
+        for show, rows in zip(shows, found):
+            for path, season, episode, size, added in rows:
+                index.store_episode(path, show, season, episode, size, added)
+            count += len(rows)
+    index.flush()
+    logger.info("Indexed %s episodes of %s shows in %s", count, len(shows), shows_dir, extra={"indent": 0})
+    return count
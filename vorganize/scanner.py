@@ -0,0 +1,92 @@
+import fnmatch
+import logging
+import os
+from collections import namedtuple
+from pathlib import Path
+from .core import subtitle_dirs
+from .metrics import get_metrics
+"""_summary_:
+Streaming directory scanner.
+This module walks a source tree with os.scandir and yields video files lazily, so classification and moving
+can start before the walk is finished and memory stays flat on huge trees. Subtitles seen during the walk are
+added to a SubtitleIndex, so no second pass is needed to match them.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Patterns ending in "/" only match directories
+default_ignore = ["sample/", "samples/", "extras/", "featurettes/", ".*", "*.part", "*.!qb", "*.crdownload"]
+
+ScanItem = namedtuple("ScanItem", "relpath entry")
+
+
+def _compile_ignore(ignore):
+    dir_patterns, file_patterns = [], []
+    for pattern in ignore:
+        if pattern.endswith("/"):
+            dir_patterns.append(pattern[:-1].lower())
+        else:
+            dir_patterns.append(pattern.lower())
+            file_patterns.append(pattern.lower())
+    return dir_patterns, file_patterns
+
+
+def _ignored(name, patterns):
+    name = name.lower()
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def scan_videos(path, video_ext, subtitle_index=None, max_depth=4, ignore=default_ignore, forget_subtitles=True):
+    """
+    Yield a ScanItem(relpath, DirEntry) for every video file under path, up to max_depth folders deep.
+    Each directory is listed once; its videos are yielded after the whole listing (and any Subs/ folder)
+    has been read, so subtitle_index already knows their subtitles. A directory's subtitles are dropped from
+    subtitle_index once its videos have been consumed, unless forget_subtitles is False (for callers that
+    collect the items before looking their subtitles up).
+    """
+    video_ext = {ext.lower() for ext in video_ext}
+    dir_patterns, file_patterns = _compile_ignore(ignore)
+    metrics = get_metrics()
+    stack = [("", 0)]
+    while stack:
+        relative_dir, depth = stack.pop()
+        directory = Path(path) / relative_dir if relative_dir else Path(path)
+        prefix = f"{relative_dir}/" if relative_dir else ""
+        videos, subdirs = [], []
+        metrics.add("scandir_calls")
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if is_dir:
+                        if _ignored(entry.name, dir_patterns):
+                            continue
+                        if entry.name.lower() in subtitle_dirs:
+                            if subtitle_index is not None:
+                                subtitle_index.scan_subdir(entry, prefix)
+                        elif depth < max_depth:
+                            subdirs.append(entry.name)
+                        continue
+                    if _ignored(entry.name, file_patterns):
+                        continue
+                    ext = entry.name.rpartition(".")[2].lower()
+                    if ext in video_ext:
+                        if entry.is_file():
+                            videos.append(entry)
+                    elif subtitle_index is not None:
+                        subtitle_index.add(prefix + entry.name)
+        except OSError as e:
+            logger.error("Failed to scan %s: %s", directory, e, extra={"indent": 2})
+            continue
+
+        metrics.add("videos_found", len(videos))
+        for entry in videos:
+            yield ScanItem(prefix + entry.name, entry)
+        if subtitle_index is not None and forget_subtitles:
+            subtitle_index.forget(relative_dir)
+        # Reverse so subdirectories are walked in listing order
+        stack.extend((prefix + name, depth + 1) for name in reversed(subdirs))
+
@@ -1,39 +1,217 @@
+from contextlib import contextmanager
 from pathlib import Path
+import bisect
+import hashlib
 import json
 import logging
-from .core import find_subtitle
+import os
+import tempfile
+from .core import subtitle_list
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent runs are not serialized
+    fcntl = None
 """_summary_:
 Save video metadata to JSON files.
 This module provides functionality to store video metadata in JSON files for Movies, TV Shows, and Other Videos.
-It handles the creation of directories, checks for existing files, and appends new entries as needed.
+Entries are collected in memory by a JsonCatalog, which loads each JSON file once per run and writes it back
+atomically when flushed, so a run no longer re-reads and rewrites the whole catalog for every file.
+Each write holds an exclusive lock and first merges in what other runs wrote since the file was loaded,
+so concurrent runs sharing the catalog never lose each other's entries.
 """
 
 logger = logging.getLogger(__name__)
 
-def store_as_json(video_type, data, json_file):
-    """Store video metadata in JSON files."""
-    file_type = {"s": "shows", "m": "movies", "o": "videos"}[video_type]
-    json_path = Path(json_file)
-    json_data = {file_type: [], f"{file_type}_subtitles": []}
-    if json_path.exists():
-        with open(json_path, "r") as f:
-            json_data = json.load(f)
-        if file_type not in json_data:
-            json_data[file_type] = []
-        if f"{file_type}_subtitles" not in json_data:
-            json_data[f"{file_type}_subtitles"] = []
-        if file_type == "shows" and isinstance(json_data[file_type], dict):
-            json_data[file_type] = sorted(json_data[file_type].keys())
-
-    item_to_add = data[0] if video_type == "s" else data
-    if item_to_add not in json_data[file_type]:
-        json_data[file_type].append(item_to_add)
-        json_data[file_type].sort()
-
-    subtitle_file = data[2] if video_type == "s" else find_subtitle(data, json_path.parent)
-    if subtitle_file and subtitle_file not in json_data[f"{file_type}_subtitles"]:
-        json_data[f"{file_type}_subtitles"].append(subtitle_file)
-        json_data[f"{file_type}_subtitles"].sort()
-
-    with open(json_path, "w") as f:
-        json.dump(json_data, f, indent=4)
\ No newline at end of file
+FILE_TYPES = {"s": "shows", "m": "movies", "o": "videos"}
+# Where shows.json, movies.json, other_videos.json and the run journals are kept by default
+DEFAULT_SCRIPT_DIR = os.path.expanduser("~/.local/movies_script")
+
+
+def _lock_path(path, lock_dir=None):
+    """Hidden lock file for path: next to it, or in lock_dir named after the full path (e.g. script_dir)."""
+    path = Path(path)
+    if lock_dir is None:
+        return path.with_name(f".{path.name}.lock")
+    digest = hashlib.blake2b(os.fsencode(os.path.abspath(path)), digest_size=6).hexdigest()
+    return Path(lock_dir) / f".{path.name}.{digest}.lock"
+
+
+@contextmanager
+def _locked(path, lock_dir=None):
+    """Hold an exclusive lock on a hidden .lock file for path (a no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    lock_path = _lock_path(path, lock_dir)
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+class _JsonDocument:
+    """In-memory copy of one catalog JSON file with set-backed membership."""
+
+    def __init__(self, json_path, lock_dir=None):
+        self.path = Path(json_path)
+        self.lock_dir = lock_dir
+        self.data = {}
+        self.members = {}
+        self.dirty = False
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                self.data = json.load(f)
+
+    def ensure(self, file_type):
+        """Make sure the entry and subtitle lists for file_type exist and are indexed."""
+        if file_type in self.members:
+            return
+        for key in (file_type, f"{file_type}_subtitles"):
+            entries = self.data.get(key, [])
+            if isinstance(entries, dict):
+                entries = list(entries.keys())
+            entries = sorted(set(entries))
+            self.data[key] = entries
+            self.members[key] = set(entries)
+
+    def add(self, key, item):
+        """Insert item into the sorted list under key unless it is already present."""
+        if item in self.members[key]:
+            return False
+        self.members[key].add(item)
+        bisect.insort(self.data[key], item)
+        self.dirty = True
+        return True
+
+    def merge_from_disk(self):
+        """Add the entries another run wrote to the file since it was loaded."""
+        if not self.path.exists():
+            return
+        with open(self.path, "r") as f:
+            on_disk = json.load(f)
+        for key, entries in on_disk.items():
+            if key not in self.members:
+                # Lists this run never touched are taken as they are on disk
+                self.data[key] = entries
+                continue
+            if isinstance(entries, dict):
+                entries = list(entries.keys())
+            new = set(entries) - self.members[key]
+            if new:
+                self.members[key] |= new
+                self.data[key] = sorted(self.members[key])
+
+    def write(self):
+        """Merge in concurrent changes and write the document through a temporary file and an atomic rename."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with _locked(self.path, self.lock_dir):
+            self.merge_from_disk()
+            self._replace()
+        self.dirty = False
+
+    def _replace(self):
+        fd, tmp_name = tempfile.mkstemp(
+            prefix=f".{self.path.name}.", suffix=".tmp", dir=self.path.parent
+        )
+        try:
+            # mkstemp creates 0600 files; keep the mode of the file being replaced
+            os.chmod(tmp_name, self.path.stat().st_mode & 0o777 if self.path.exists() else 0o644)
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+
+class JsonCatalog:
+    """
+    Batched catalog for shows.json, movies.json and other_videos.json.
+    Each JSON file is read once, updated in memory and flushed every `flush_every`
+    new entries, on close, or when the `with` block is left (including on Ctrl+C).
+    lock_dir keeps the lock files of concurrent writers (default: next to each JSON file); main uses
+    script_dir, so JSON files written into the library by interactive mode leave no lock files there.
+    """
+
+    def __init__(self, flush_every=500, lock_dir=None):
+        self.flush_every = flush_every
+        self.lock_dir = lock_dir
+        self._documents = {}
+        self._pending = 0
+
+    def _document(self, json_file):
+        key = str(json_file)
+        document = self._documents.get(key)
+        if document is None:
+            document = _JsonDocument(json_file, self.lock_dir)
+            self._documents[key] = document
+        return document
+
+    def store(self, video_type, data, json_file, source=None, subtitle=None):
+        """Record video metadata; same arguments as store_as_json."""
+        file_type = FILE_TYPES[video_type]
+        document = self._document(json_file)
+        document.ensure(file_type)
+
+        item_to_add = data[0] if video_type == "s" else data
+        added = document.add(file_type, item_to_add)
+
+        for subtitle_file in subtitle_list(subtitle):
+            subtitle_name = subtitle_file.rsplit("/", 1)[-1]
+            added = document.add(f"{file_type}_subtitles", subtitle_name) or added
+
+        if added:
+            self._pending += 1
+            if self.flush_every and self._pending >= self.flush_every:
+                self.flush()
+
+    def lookup(self, source, st=None):
+        """The JSON catalog does not track source files, so nothing is ever skipped."""
+        return None
+
+    def mark_moved(self, source, destination):
+        """The JSON catalog does not track move status."""
+
+    def forget(self, source):
+        """The JSON catalog does not track source files."""
+
+    def flush(self):
+        """Atomically write every modified JSON file."""
+        for document in self._documents.values():
+            if document.dirty:
+                document.write()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.flush()
+        except OSError as e:
+            logger.error("Failed to save catalog: %s", e, extra={"indent": 0})
+            if exc_type is None:
+                raise
+        return False
+
+
+def store_as_json(video_type, data, json_file, catalog=None, source=None, subtitle=None):
+    """Store video metadata in JSON files, through `catalog` when one is given."""
+    if catalog is not None:
+        catalog.store(video_type, data, json_file, source=source, subtitle=subtitle)
+        return
+    catalog = JsonCatalog(flush_every=None)
+    catalog.store(video_type, data, json_file, source=source, subtitle=subtitle)
+    catalog.flush()
@@ -0,0 +1,111 @@
+import logging
+import os
+import re
+from pathlib import Path
+from .metrics import get_metrics
+"""_summary_:
+Series folder index.
+This module maps the series titles found in filenames to the show folders that already exist in the
+destination, so "Mr.Robot", "Mr Robot (2015)" and "Mr Robot - Season 4" all land in one folder. Folder names
+and titles are reduced to a key (case-folded, punctuation, years and season suffixes removed); the shows
+folder is listed once per run (again only when its mtime changes) and each lookup is a dict access. New
+folders are added as they are planned, and an optional fuzzy match (difflib) catches near-misses such as typos.
+"""
+
+logger = logging.getLogger(__name__)
+
+# e.g. "Squid Game - Season 3", "Show S02", "Show Series 2", "Show (Season 1-3)"; not a possessive ("Blake's 7")
+_season_suffix = re.compile(r"[\s._-]*[(\[]?\b(?:season|series|(?<!['’])s)[\s._-]*\d{1,2}(?:[\s._-]*-[\s._-]*\d{1,2})?[)\]]?\s*$", re.IGNORECASE)
+# e.g. "Doctor Who (2005)", "Shogun 2024"; a title that is only a year is kept
+_year_suffix = re.compile(r"(?<=\S)[\s._-]*[(\[]?\b(?:19|20)\d{2}[)\]]?\s*$")
+_non_word = re.compile(r"[\W_]+")
+
+
+def strip_season(title):
+    """Title without a trailing season suffix ("Squid Game - Season 3" -> "Squid Game")."""
+    return _season_suffix.sub("", title).strip(" ._-") or title
+
+
+def normalize_title(title):
+    """Lookup key of a series title or folder name: case-folded, without season suffix, year or punctuation."""
+    key = strip_season(title)
+    key = _year_suffix.sub("", key)
+    key = _non_word.sub(" ", key.replace("&", " and ")).casefold().split()
+    return " ".join(key)
+
+
+class ShowIndex:
+    """
+    Normalized titles of the show folders below shows_dir, listed on first use.
+    fuzzy is a difflib similarity cutoff between 0 and 1 for titles without an exact key (None = off).
+    """
+
+    def __init__(self, shows_dir, fuzzy=None):
+        if fuzzy is not None and not 0 < fuzzy <= 1:
+            raise ValueError(f"Invalid fuzzy cutoff {fuzzy!r} (expected a number between 0 and 1)")
+        self.shows_dir = Path(shows_dir)
+        self.fuzzy = fuzzy
+        self._folders = None  # key -> folder name
+        self._resolved = {}  # title -> folder name
+        self._mtime = None
+
+    def _mtime_ns(self):
+        try:
+            return os.stat(self.shows_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        """List shows_dir, adding its folders to the ones already known (planned folders may not exist yet)."""
+        if self._folders is None:
+            self._folders = {}
+        self._mtime = self._mtime_ns()
+        try:
+            with os.scandir(self.shows_dir) as entries:
+                names = sorted(entry.name for entry in entries if entry.is_dir() and not entry.name.startswith("."))
+        except FileNotFoundError:
+            names = []
+        get_metrics().add("scandir_calls")
+        # The shortest name wins ("Mr Robot" over "Mr Robot - Season 4"), so existing splits converge
+        for name in sorted(names, key=len):
+            key = normalize_title(name)
+            if key:
+                self._folders.setdefault(key, name)
+        return self._folders
+
+    def __len__(self):
+        return len(self._folders if self._folders is not None else self._load())
+
+    def __contains__(self, title):
+        folders = self._folders if self._folders is not None else self._load()
+        return normalize_title(title) in folders
+
+    def resolve(self, title):
+        """Folder name to file the series title under: an existing show folder, or a new one that is remembered."""
+        folder = self._resolved.get(title)
+        if folder is not None:
+            return folder
+        folders = self._folders if self._folders is not None else self._load()
+        key = normalize_title(title)
+        folder = folders.get(key)
+        if folder is None and self._mtime_ns() != self._mtime:
+            # Folders were added since the listing (e.g. by hand while --watch runs)
+            folder = self._load().get(key)
+        if folder is None and self.fuzzy and key and folders:
+            import difflib  # only with fuzzy matching on
+            close = difflib.get_close_matches(key, folders.keys(), n=1, cutoff=self.fuzzy)
+            if close:
+                folder = folders[close[0]]
+                logger.info("Filing %s under similar show %s", title, folder, extra={"indent": 2})
+        if folder is None:
+            folder = strip_season(title)
+            if key:
+                folders[key] = folder
+        elif folder != title:
+            logger.debug("Filing %s under existing show %s", title, folder, extra={"indent": 2})
+        self._resolved[title] = folder
+        return folder
+
+    def forget_resolved(self):
+        """Drop the titles resolved so far (e.g. between batches of a chunked run); folders stay known."""
+        self._resolved.clear()
@@ -0,0 +1,289 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+from .core import subtitle_dirs
+from .scanner import default_ignore, _compile_ignore, _ignored
+"""_summary_:
+Watch mode.
+This module follows a download folder and reports new video files once they have finished arriving, so a
+long-running process can organize them as they appear with a warm classifier and catalog. On Linux it uses
+inotify through ctypes and sleeps until the kernel reports a change; elsewhere (or when inotify is not
+available) it polls and only re-lists folders whose mtime changed. A file is only reported after its size has
+been stable for `settle` seconds and no partial-download sibling (name.part, name.!qb, ...) is left.
+"""
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_SUFFIXES = (".part", ".!qb", ".crdownload")
+
+# From linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal inotify binding: add_watch() and read() returning (wd, mask, name) tuples."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask | IN_ONLYDIR)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read(self, timeout=None):
+        """Wait up to timeout seconds (forever when None) and return the pending events."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                events.append((wd, mask, name))
+        return events
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ArrivalWatcher:
+    """
+    Report videos that appear under path after prime() was called.
+    Iterating over batches() blocks and yields lists of relative paths ready to be organized.
+    """
+
+    def __init__(self, path, video_ext, max_depth=4, ignore=default_ignore, settle=10, poll_interval=30, use_inotify=True):
+        self.path = os.fspath(path)
+        self.video_ext = {ext.lower() for ext in video_ext}
+        self.max_depth = max_depth
+        self.dir_patterns, self.file_patterns = _compile_ignore(ignore)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self._pending = {}  # relpath -> (size, time the size was last seen changing)
+        self._known = {}  # relative dir -> videos present at startup or already reported
+        self._dirs = {}  # relative dir -> (mtime_ns, subdirs) from the last listing
+        self._watches = {}  # inotify: wd -> relative dir
+        self._watched = {}  # inotify: relative dir -> wd
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except OSError as e:
+                logger.warning("inotify unavailable (%s), polling every %ss instead", e, poll_interval, extra={"indent": 0})
+
+    @property
+    def backend(self):
+        return "inotify" if self._inotify is not None else "polling"
+
+    def _is_video(self, name):
+        return name.rpartition(".")[2].lower() in self.video_ext and not _ignored(name, self.file_patterns)
+
+    def _wanted_dir(self, name, depth):
+        return depth <= self.max_depth and name.lower() not in subtitle_dirs and not _ignored(name, self.dir_patterns)
+
+    def _walk(self, relative_dir, depth, report=True):
+        """
+        List relative_dir and its subfolders; only folders whose mtime changed since the last walk are
+        listed again. Videos not seen before become pending when report is set, else they are known.
+        """
+        stack = [(relative_dir, depth)]
+        while stack:
+            relative_dir, depth = stack.pop()
+            directory = os.path.join(self.path, relative_dir)
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._dirs.pop(relative_dir, None)
+                self._known.pop(relative_dir, None)
+                continue
+            cached = self._dirs.get(relative_dir)
+            if cached is not None and cached[0] == mtime_ns:
+                subdirs = cached[1]
+            else:
+                subdirs, videos = [], set()
+                prefix = f"{relative_dir}/" if relative_dir else ""
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            try:
+                                is_dir = entry.is_dir(follow_symlinks=False)
+                            except OSError:
+                                continue
+                            if is_dir:
+                                if self._wanted_dir(entry.name, depth + 1):
+                                    subdirs.append(prefix + entry.name)
+                            elif self._is_video(entry.name):
+                                videos.add(prefix + entry.name)
+                except OSError as e:
+                    logger.error("Failed to scan %s: %s", directory, e, extra={"indent": 2})
+                    continue
+                known = self._known.get(relative_dir, set())
+                if report:
+                    for relpath in videos - known:
+                        self._pending.setdefault(relpath, (-1, time.monotonic()))
+                    # Videos that were moved away are forgotten so a new file with the same name is seen again
+                    self._known[relative_dir] = known & videos
+                else:
+                    self._known[relative_dir] = videos
+                self._dirs[relative_dir] = (mtime_ns, subdirs)
+                self._add_watch(relative_dir)
+            stack.extend((subdir, depth + 1) for subdir in subdirs)
+
+    def _add_watch(self, relative_dir):
+        if self._inotify is None or relative_dir in self._watched:
+            return
+        try:
+            wd = self._inotify.add_watch(os.path.join(self.path, relative_dir))
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                logger.warning("inotify watch limit reached (fs.inotify.max_user_watches), falling back to polling", extra={"indent": 0})
+                self._inotify.close()
+                self._inotify = None
+                self._watches, self._watched = {}, {}
+            else:
+                logger.error("Failed to watch %s: %s", relative_dir or self.path, e, extra={"indent": 2})
+            return
+        self._watches[wd] = relative_dir
+        self._watched[relative_dir] = wd
+
+    def _forget_dir(self, relative_dir):
+        """Drop state for a folder that was deleted or moved away, including its subfolders."""
+        prefix = f"{relative_dir}/"
+        for directory in [d for d in self._dirs if d == relative_dir or d.startswith(prefix)]:
+            del self._dirs[directory]
+            self._known.pop(directory, None)
+            wd = self._watched.pop(directory, None)
+            if wd is not None:
+                del self._watches[wd]
+                self._inotify.rm_watch(wd)
+        for relpath in [p for p in self._pending if p.startswith(prefix)]:
+            del self._pending[relpath]
+
+    def prime(self):
+        """Remember the videos that are already there; only later arrivals are reported."""
+        self._walk("", 0, report=False)
+        logger.info("Watching %s (%s, %s folders)", self.path, self.backend, len(self._dirs), extra={"indent": 0})
+
+    def _handle_events(self, events):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, fall back to one full walk
+                self._dirs = {}
+                self._walk("", 0)
+                continue
+            relative_dir = self._watches.get(wd)
+            if relative_dir is None:
+                continue
+            if mask & IN_IGNORED:
+                self._forget_dir(relative_dir)
+                continue
+            relpath = f"{relative_dir}/{name}" if relative_dir else name
+            if mask & IN_ISDIR:
+                depth = relpath.count("/") + 1
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget_dir(relpath)
+                elif self._wanted_dir(name, depth):
+                    # A whole release folder was created or moved in: list it (and watch it) right away
+                    self._walk(relpath, depth)
+            elif not self._is_video(name):
+                continue
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._pending.pop(relpath, None)
+                self._known.get(relative_dir, set()).discard(relpath)
+            elif relpath not in self._known.get(relative_dir, ()):
+                self._pending.setdefault(relpath, (-1, time.monotonic()))
+
+    def _partial(self, relpath):
+        full = os.path.join(self.path, relpath)
+        return any(os.path.exists(full + suffix) for suffix in PARTIAL_SUFFIXES)
+
+    def _ready(self):
+        """Move files whose size has been stable for `settle` seconds out of the pending set."""
+        now = time.monotonic()
+        ready = []
+        for relpath, (size, since) in list(self._pending.items()):
+            try:
+                current = os.stat(os.path.join(self.path, relpath)).st_size
+            except OSError:
+                del self._pending[relpath]
+                continue
+            if current != size:
+                self._pending[relpath] = (current, now)
+            elif now - since >= self.settle and not self._partial(relpath):
+                del self._pending[relpath]
+                self._known.setdefault(relpath.rpartition("/")[0], set()).add(relpath)
+                ready.append(relpath)
+        return sorted(ready)
+
+    def batches(self):
+        """Block until new videos have settled and yield them in sorted batches; runs until interrupted."""
+        next_poll = time.monotonic() + self.poll_interval
+        while True:
+            # Only wake up regularly while something is still settling
+            check = min(1.0, self.settle) if self._pending else None
+            if self._inotify is not None:
+                self._handle_events(self._inotify.read(check))
+            else:
+                now = time.monotonic()
+                time.sleep(max(0.0, min(check or self.poll_interval, next_poll - now)))
+                if time.monotonic() >= next_poll:
+                    self._walk("", 0)
+                    next_poll = time.monotonic() + self.poll_interval
+            if self._pending:
+                ready = self._ready()
+                if ready:
+                    yield ready
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False